@@ -0,0 +1,153 @@
+"""
+Admission control for database-backed requests.
+
+Every connection pool has its own controller, so reports queue only behind other reports. At
+most max_concurrent requests do database work on a pool at once. Others wait in a bounded queue,
+served by priority class and then in arrival order, and are shed with 503 once the queue is
+full or they have waited max_wait seconds. A slow database then costs clients a quick retry
+instead of piling requests up on the connection pool until they time out.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from database_operations.database import OLTP, POOL_CONFIG, REPORTING_POOL_CONFIG
+from database_operations.metrics import Counter, Gauge, Histogram
+
+# Priority classes, most favored first
+WRITE = 0
+READ = 1
+REPORT = 2
+PRIORITY_NAMES = {WRITE: "write", READ: "read", REPORT: "report"}
+
+ADMISSION_CONFIG = {
+    # Requests doing database work at once on the OLTP pool; 0 disables admission control
+    "max_concurrent": int(os.getenv("ADMISSION_MAX_CONCURRENT", str(POOL_CONFIG["maxsize"]))),
+    # The same for the reporting pool
+    "reporting_max_concurrent": int(
+        os.getenv("ADMISSION_REPORTING_MAX_CONCURRENT", str(REPORTING_POOL_CONFIG["maxsize"]))
+    ),
+    "queue_size": int(os.getenv("ADMISSION_QUEUE_SIZE", "100")),
+    # Seconds a request may wait for its turn before it is shed
+    "max_wait": float(os.getenv("ADMISSION_MAX_WAIT", "1")),
+    # Sent as Retry-After with shed requests
+    "retry_after": int(os.getenv("ADMISSION_RETRY_AFTER", "1")),
+}
+
+ADMISSION_REQUESTS = Counter(
+    "admission_requests_total",
+    "Requests seen by admission control by pool, priority and outcome (admitted, queue_full, timeout, displaced).",
+    ("pool", "priority", "outcome")
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds", "Time admitted requests waited for their turn.", ("pool", "priority")
+)
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Requests admitted and doing database work.", ("pool",))
+ADMISSION_QUEUED = Gauge("admission_queued", "Requests waiting for admission.", ("pool",))
+
+
+class AdmissionRejected(Exception):
+    """A request was shed instead of admitted."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Request shed by admission control: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Priority-ordered admission with a bounded wait queue.
+
+    A released slot goes straight to the most favored waiter, so slots are never up for grabs
+    between requests. When the queue is full, a request displaces the newest waiter of a less
+    favored class if there is one, so writes are not shed while reports wait.
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_CONFIG["max_concurrent"],
+                 queue_size: int = ADMISSION_CONFIG["queue_size"], max_wait: float = ADMISSION_CONFIG["max_wait"],
+                 retry_after: int = ADMISSION_CONFIG["retry_after"], name: str = OLTP, clock=time.monotonic):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._clock = clock
+        self._active = 0
+        # Heap of [priority, arrival, future]
+        self._waiters = []
+        self._arrivals = itertools.count()
+        ADMISSION_IN_FLIGHT.set_function(lambda: self._active, name)
+        ADMISSION_QUEUED.set_function(lambda: len(self._waiters), name)
+
+    def _reject(self, priority: int, reason: str):
+        ADMISSION_REQUESTS.inc(self.name, PRIORITY_NAMES[priority], reason)
+        return AdmissionRejected(reason, self.retry_after)
+
+    def _remove(self, entry):
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+
+    async def acquire(self, priority: int):
+        """Wait for a slot, raising AdmissionRejected if the request is shed instead."""
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            ADMISSION_REQUESTS.inc(self.name, PRIORITY_NAMES[priority], "admitted")
+            ADMISSION_WAIT_SECONDS.observe(0, self.name, PRIORITY_NAMES[priority])
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            # The least favored, most recent waiter
+            worst = max(self._waiters, default=None)
+            if worst is None or worst[0] <= priority:
+                raise self._reject(priority, "queue_full")
+            self._remove(worst)
+            worst[2].set_exception(self._reject(worst[0], "displaced"))
+
+        started = self._clock()
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._arrivals), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            if entry in self._waiters:
+                self._remove(entry)
+            raise self._reject(priority, "timeout") from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # The slot was handed over just as the request went away
+                self.release()
+            elif entry in self._waiters:
+                self._remove(entry)
+            raise
+        ADMISSION_REQUESTS.inc(self.name, PRIORITY_NAMES[priority], "admitted")
+        ADMISSION_WAIT_SECONDS.observe(self._clock() - started, self.name, PRIORITY_NAMES[priority])
+
+    def release(self):
+        """Give the slot to the most favored waiter, or free it."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            # A waiter whose deadline just passed may not have removed itself yet
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def admit(self, priority: int):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "queue_size": self.queue_size,
+        }
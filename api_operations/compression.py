@@ -0,0 +1,176 @@
+"""
+Response compression negotiated through Accept-Encoding.
+
+zstd is preferred when the client accepts it and the zstandard package is installed, since it
+compresses listings about as well as gzip for a fraction of the CPU; gzip is the fallback every
+client supports. zstandard is pinned in requirements.txt; an install without it only loses zstd.
+"""
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_CONFIG = {
+    # Responses smaller than this go out uncompressed
+    "min_size": int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    "gzip_level": int(os.getenv("COMPRESSION_GZIP_LEVEL", "5")),
+    "zstd_level": int(os.getenv("COMPRESSION_ZSTD_LEVEL", "1")),
+}
+
+# Responses that never carry a body
+_BODYLESS_STATUSES = {204, 304}
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        # wbits=31 writes the gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # A sync flush hands every chunk to the client now instead of when deflate's window fills
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class _ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encodings() -> list:
+    """Content codings that can be produced, most preferred first."""
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def choose_encoding(accept_encoding: str, offered: list):
+    """The offered coding with the highest quality in Accept-Encoding, or None for identity."""
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+
+    best, best_quality = None, 0.0
+    for name in offered:
+        quality = qualities.get(name, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses of at least min_size bytes.
+
+    Complete bodies are compressed in one go. Streamed bodies are held back only until min_size
+    bytes have arrived, then compressed chunk by chunk and flushed after each one, so a streaming
+    listing keeps arriving incrementally. A stream that ends below min_size is sent as is.
+    """
+
+    def __init__(self, app, min_size: int = COMPRESSION_CONFIG["min_size"],
+                 gzip_level: int = COMPRESSION_CONFIG["gzip_level"],
+                 zstd_level: int = COMPRESSION_CONFIG["zstd_level"]):
+        self.app = app
+        self.min_size = min_size
+        self.levels = {"gzip": gzip_level, "zstd": zstd_level}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), available_encodings())
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressingResponder(self, encoding)(scope, receive, send)
+
+
+class _CompressingResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str):
+        self.app = middleware.app
+        self.min_size = middleware.min_size
+        self.encoding = encoding
+        self.level = middleware.levels[encoding]
+        self.send = None
+        self.start_message = None
+        self.buffered = []
+        self.buffered_size = 0
+        self.encoder = None
+        # None until the first body message decides whether to compress
+        self.compressing = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _skip(self, headers: Headers) -> bool:
+        return "content-encoding" in headers or self.start_message["status"] in _BODYLESS_STATUSES
+
+    async def _start(self, body: bytes, more_body: bool):
+        """Send the response start, compressed or not, followed by the body seen so far."""
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if self.compressing:
+            self.encoder = (_ZstdEncoder if self.encoding == "zstd" else _GzipEncoder)(self.level)
+            headers["Content-Encoding"] = self.encoding
+            if more_body:
+                del headers["Content-Length"]
+                body = self.encoder.compress(body)
+            else:
+                body = self.encoder.finish(body)
+                headers["Content-Length"] = str(len(body))
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the body shows whether the headers change
+            self.start_message = message
+            if self._skip(Headers(raw=message["headers"])):
+                self.compressing = False
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressing is None:
+            self.buffered.append(body)
+            self.buffered_size += len(body)
+            if more_body and self.buffered_size < self.min_size:
+                return
+            self.compressing = self.buffered_size >= self.min_size
+            body = b"".join(self.buffered)
+            self.buffered = []
+            await self._start(body, more_body)
+            return
+
+        if self.compressing:
+            body = self.encoder.compress(body) if more_body else self.encoder.finish(body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
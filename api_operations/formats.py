@@ -0,0 +1,156 @@
+"""
+Binary representations of item listings, chosen through the Accept header.
+
+msgpack and pyarrow are pinned in requirements.txt. An install without one of them still runs;
+the format whose library is missing is simply not offered.
+"""
+import io
+from datetime import datetime
+from decimal import Decimal
+from fastapi.responses import Response
+from database_operations.decoders import ITEM_ROW
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# Other names clients send for the same formats
+_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+
+def available_media_types() -> list:
+    """Media types that can be produced, in order of preference when a client accepts any."""
+    media_types = [JSON]
+    if msgpack is not None:
+        media_types.append(MSGPACK)
+    if pyarrow is not None:
+        media_types.append(ARROW_STREAM)
+    return media_types
+
+
+def negotiate(accept: str, offered: list):
+    """
+    Pick the offered media type the Accept header ranks highest, or None if it accepts none of
+    them. A missing or empty header accepts the first offered type.
+    """
+    if not accept or not accept.strip():
+        return offered[0]
+
+    ranges = []
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ranges.append((_ALIASES.get(media_type.lower(), media_type.lower()), quality))
+
+    best, best_quality = None, 0.0
+    for media_type in offered:
+        # The most specific matching range decides the quality
+        quality = None
+        for pattern in (media_type, media_type.split("/")[0] + "/*", "*/*"):
+            matches = [q for candidate, q in ranges if candidate == pattern]
+            if matches:
+                quality = max(matches)
+                break
+        if quality and quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def _msgpack_default(value):
+    # Same representations as the JSON responses
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+class MessagePackResponse(Response):
+    """
+    MessagePack rendering of a listing whose items are tuple rows. Rows are packed as arrays,
+    with the column names given once in "columns".
+    """
+
+    media_type = MSGPACK
+
+    def render(self, content) -> bytes:
+        if "items" in content:
+            content = {"columns": ITEM_ROW.columns, **content}
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def arrow_schema(metadata: dict = None):
+    return pyarrow.schema(
+        [
+            ("id", pyarrow.string()),
+            ("name", pyarrow.string()),
+            ("category", pyarrow.string()),
+            ("price", pyarrow.decimal128(12, 2)),
+            ("last_updated_dt", pyarrow.timestamp("s")),
+        ],
+        metadata=metadata,
+    )
+
+
+def arrow_record_batch(rows, schema):
+    """Build a record batch from tuple rows in ITEM_ROW.columns order, one column at a time."""
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pyarrow.record_batch(
+        [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def encode_arrow(rows, metadata: dict = None) -> bytes:
+    """Encode tuple rows as a complete single-batch Arrow IPC stream."""
+    schema = arrow_schema(metadata)
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(arrow_record_batch(rows, schema))
+    return sink.getvalue()
+
+
+async def encode_arrow_stream(batches, metadata: dict = None):
+    """
+    Encode batches of tuple rows as an Arrow IPC stream, yielding bytes as each is written.
+
+    The schema goes out with the first batch, so nothing is produced before the first batch is.
+    """
+    schema = arrow_schema(metadata)
+    sink = io.BytesIO()
+
+    def take():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    writer = pyarrow.ipc.new_stream(sink, schema)
+    try:
+        async for rows in batches:
+            writer.write_batch(arrow_record_batch(rows, schema))
+            yield take()
+    finally:
+        writer.close()
+    # The end-of-stream marker
+    yield take()
@@ -0,0 +1,189 @@
+"""
+Logging that stays off the event loop.
+
+Loggers only hand records to a QueueHandler; a QueueListener thread formats them and writes
+them out, so a slow terminal or disk never stalls request handling. Records carry the id of
+the request they were logged for and are written as JSON lines by default.
+
+Record arguments are formatted by the listener thread, so they must not be modified after
+being logged.
+"""
+import contextvars
+import logging
+import os
+import queue
+import sys
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+from database_operations.metrics import Counter
+
+
+def _parse_levels(value: str) -> dict:
+    """Parse "app=DEBUG,database_operations.crud=WARNING" into {logger name: level}."""
+    levels = {}
+    for entry in value.split(","):
+        name, _, level = entry.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+LOGGING_CONFIG = {
+    "level": os.getenv("LOG_LEVEL", "INFO").upper(),
+    # Per-logger overrides of the root level
+    "levels": _parse_levels(os.getenv("LOG_LEVELS", "")),
+    # "json" or "text"
+    "format": os.getenv("LOG_FORMAT", "json"),
+    # DEBUG records let through per logger and second; the rest are dropped and counted
+    "debug_rate": float(os.getenv("LOG_DEBUG_RATE", "10")),
+    # Records waiting for the listener; further records are dropped and counted
+    "queue_size": int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+}
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total", "Log records dropped before being written, by reason.", ("reason",)
+)
+
+# Id of the request being handled, "-" outside of requests
+request_id = contextvars.ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the request id while still in the context of the code logging them."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class DebugRateLimiter(logging.Filter):
+    """
+    Let through at most rate DEBUG records per logger and second, so debug logging left on for a
+    hot path costs a bounded amount of I/O whatever the load. Other levels always pass.
+    """
+
+    def __init__(self, rate: float = LOGGING_CONFIG["debug_rate"], clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self._clock = clock
+        # logger name -> [tokens, last refill]
+        self._buckets = {}
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG:
+            return True
+        now = self._clock()
+        bucket = self._buckets.get(record.name)
+        if bucket is None:
+            bucket = self._buckets[record.name] = [self.rate, now]
+        else:
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            LOG_RECORDS_DROPPED.inc("debug_rate")
+            return False
+        bucket[0] -= 1
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread and drops records, rather than
+    blocking or writing a traceback, when the queue is full.
+    """
+
+    def prepare(self, record):
+        # The stock prepare() formats the message here, on the event loop
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc("queue_full")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+    def formatTime(self, record, datefmt=None):
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+
+def configure_logging(config: dict = LOGGING_CONFIG, stream=None) -> QueueListener:
+    """
+    Route every log record through a bounded queue to a listener thread writing to stream
+    (stderr by default), replacing the root logger's handlers. The returned listener has been
+    started; stop it on shutdown to flush what is still queued.
+    """
+    output = logging.StreamHandler(stream or sys.stderr)
+    if config["format"] == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    handler = NonBlockingQueueHandler(queue.Queue(config["queue_size"]))
+    handler.addFilter(DebugRateLimiter(config["debug_rate"]))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(config["level"])
+    for name, level in config["levels"].items():
+        logging.getLogger(name).setLevel(level)
+
+    listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every request an id, taken from X-Request-ID when the client sends
+    one, made available to log records and echoed in the response's X-Request-ID header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                # Bounded, printable ids only, since they end up in every log line
+                candidate = value.decode("latin-1")
+                if 0 < len(candidate) <= 128 and candidate.isprintable():
+                    current = candidate
+                break
+        if current is None:
+            current = uuid.uuid4().hex
+        header = current.encode("latin-1")
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", header)]
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(token)
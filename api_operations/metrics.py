@@ -0,0 +1,44 @@
+from time import perf_counter
+from database_operations.metrics import Counter, Histogram
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending its last byte.",
+    ("route", "method", "status")
+)
+REQUEST_ERRORS = Counter(
+    "http_request_errors_total", "Requests that failed with a server error, by cause.",
+    ("route", "method", "error")
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every request by route template, so /items/ is one series whatever
+    its parameters. Requests that match no route are grouped under "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the scope
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                perf_counter() - started, getattr(route, "path", "unmatched"), scope["method"], str(status)
+            )
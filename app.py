@@ -1,73 +1,525 @@
 import aiomysql
+import contextlib
+import hashlib
 import logging
-from fastapi import FastAPI, Query, HTTPException, Depends
-from database_operations.crud import insert_item, get_items_within_date_range
-from database_operations.models import ItemResponse, DateRangeInput, CategoryInput
-from database_operations.database import create_db_pool
+import orjson
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from typing import List, Literal
+from fastapi import FastAPI, Query, HTTPException, Depends, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from api_operations.admission import ADMISSION_CONFIG, READ, REPORT, WRITE, AdmissionController, AdmissionRejected
+from api_operations.compression import CompressionMiddleware
+from api_operations.logs import RequestIdMiddleware, configure_logging
+from api_operations.metrics import MetricsMiddleware, REQUEST_ERRORS
+from api_operations.formats import (
+    ARROW_STREAM, JSON as JSON_MEDIA_TYPE, MSGPACK, MessagePackResponse, available_media_types, encode_arrow, encode_arrow_stream, negotiate
+)
+from api_operations.responses import FastJSONResponse, dumps_json
+from database_operations.crud import (
+    insert_item, insert_items, import_items, get_items_within_date_range, iter_items_within_date_range,
+    read_flights, MAX_PAGE_SIZE
+)
+from database_operations.models import ItemResponse, BulkItemResponse, ImportSummary, DateRangeInput, CategoryInput
+from database_operations import metrics, statements
+from database_operations.database import (
+    create_db_pool, create_reporting_pool, close_db_pool, get_db_pool, get_reporting_pool, DatabasePool,
+    PoolAcquireTimeout
+)
+from database_operations.coalescer import COALESCER_CONFIG, WriteCoalescer
+from database_operations.cache import CATEGORY_CACHE_CONFIG, ALL_CATEGORIES, MISSING, CategoryCache
+from database_operations.slow_queries import slow_queries
+from database_operations.watermark import ChangeWatermark, fold_change_count, write_count
 
-app = FastAPI()
 
-# Configure logging settings
-logging.basicConfig(level=logging.DEBUG)  # Set logging level to DEBUG
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener = configure_logging()
+    # Pools for the lifetime of the application, drained on shutdown
+    app.state.db_pool = await create_db_pool()
+    app.state.reporting_pool = await create_reporting_pool()
+    app.state.change_watermark = ChangeWatermark()
+    try:
+        await fold_change_count(app.state.db_pool)
+    except (aiomysql.MySQLError, PoolAcquireTimeout) as e:
+        # Only the change count table's size depends on it
+        logger.warning("Could not fold items_change_count: %s", e)
+    if ADMISSION_CONFIG["max_concurrent"] > 0:
+        # One controller per pool, keyed by pool name
+        app.state.admission = {app.state.db_pool.name: AdmissionController(name=app.state.db_pool.name)}
+        if app.state.reporting_pool is not None:
+            name = app.state.reporting_pool.name
+            app.state.admission[name] = AdmissionController(
+                max_concurrent=ADMISSION_CONFIG["reporting_max_concurrent"], name=name
+            )
+    if CATEGORY_CACHE_CONFIG["ttl"] > 0:
+        app.state.category_cache = CategoryCache()
+    if COALESCER_CONFIG["enabled"]:
+        # Each flushed batch takes one write slot; callers waiting to be batched take none
+        app.state.write_coalescer = WriteCoalescer(
+            app.state.db_pool, category_cache=getattr(app.state, "category_cache", None),
+            admit=lambda: _admitted(getattr(app.state, "admission", None), app.state.db_pool, WRITE)
+        )
+    try:
+        yield
+    finally:
+        if getattr(app.state, "write_coalescer", None) is not None:
+            await app.state.write_coalescer.close()
+        if app.state.reporting_pool is not None:
+            await close_db_pool(app.state.reporting_pool)
+        await close_db_pool(app.state.db_pool)
+        log_listener.stop()
+
+
+def get_write_coalescer(request: Request):
+    # None unless write coalescing is enabled
+    return getattr(request.app.state, "write_coalescer", None)
+
+
+def get_category_cache(request: Request):
+    # None when the category cache is disabled
+    return getattr(request.app.state, "category_cache", None)
+
+
+def get_admission_controllers(request: Request) -> dict:
+    # Empty when admission control is disabled
+    return getattr(request.app.state, "admission", None) or {}
+
+
+def _admitted(admission: dict, db_pool: DatabasePool, priority: int):
+    """Hold a slot of the given priority class for work on db_pool, if admission control is enabled."""
+    controller = admission.get(db_pool.name) if admission else None
+    return controller.admit(priority) if controller is not None else contextlib.nullcontext()
+
+
+async def _admitted_chunks(chunks, admission: dict, db_pool: DatabasePool, priority: int):
+    # A streamed response does database work until its last chunk, so it keeps its slot until then
+    try:
+        async with _admitted(admission, db_pool, priority):
+            async for chunk in chunks:
+                yield chunk
+    finally:
+        await chunks.aclose()
+
+
+def get_change_watermark(request: Request):
+    # None when the application was started without its lifespan; no ETags are sent then
+    return getattr(request.app.state, "change_watermark", None)
+
+
+async def _current_etag(change_watermark: ChangeWatermark, db_pool: DatabasePool, *parts, admission: dict = None):
+    """
+    Weak ETag for a response built from items with the given parameters, or None if there is no
+    watermark to derive it from. Reading the watermark takes a READ admission slot, so a saturated
+    pool sheds it quickly and the response goes without an ETag.
+
+    It is taken before the query runs, so a write landing in between can only make the ETag older
+    than the body and cost a later client a full response, never a wrong 304.
+    """
+    if change_watermark is None:
+        return None
+    watermark = await change_watermark.current(db_pool, admit=lambda: _admitted(admission, db_pool, READ))
+    if watermark is None:
+        return None
+    digest = hashlib.blake2b(repr((watermark, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _etag_headers(etag: str):
+    return {"ETag": etag} if etag is not None else None
+
+
+def _not_modified(request: Request, etag: str):
+    """A 304 response if the request's If-None-Match matches etag, otherwise None."""
+    if_none_match = request.headers.get("if-none-match")
+    if etag is None or if_none_match is None:
+        return None
+    # If-None-Match uses weak comparison
+    opaque_tag = etag.removeprefix("W/")
+    if if_none_match.strip() == "*" or any(
+        candidate.strip().removeprefix("W/") == opaque_tag for candidate in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+# Times compression too
+app.add_middleware(MetricsMiddleware)
+# Added last so it is outermost and every log record of a request carries its id
+app.add_middleware(RequestIdMiddleware)
+
 logger = logging.getLogger(__name__)
 
+
+def _pool_exhausted(route: str, method: str, e: PoolAcquireTimeout) -> HTTPException:
+    """503 for a request that gave up waiting for a database connection."""
+    REQUEST_ERRORS.inc(route, method, "pool_timeout")
+    logger.warning("%s", e)
+    return HTTPException(status_code=503, detail="Database busy, try again later", headers={"Retry-After": "1"})
+
+
+def _shed(route: str, method: str, e: AdmissionRejected) -> HTTPException:
+    """503 for a request shed by admission control."""
+    REQUEST_ERRORS.inc(route, method, "shed")
+    logger.warning("%s %s: %s", method, route, e)
+    return HTTPException(
+        status_code=503, detail="Server busy, try again later", headers={"Retry-After": str(e.retry_after)}
+    )
+
+
 @app.post("/items/", response_model=ItemResponse)
-async def create_item(item: dict, db_pool: aiomysql.Pool = Depends(create_db_pool)):
+async def create_item(
+    item: dict,
+    db_pool: DatabasePool = Depends(get_db_pool),
+    write_coalescer: WriteCoalescer = Depends(get_write_coalescer),
+    category_cache: CategoryCache = Depends(get_category_cache),
+    admission: dict = Depends(get_admission_controllers)
+):
     try:
-        logger.debug("Creating item: %s", item)
-        created_item = await insert_item(item, db_pool)
+        logger.debug("Creating item %r", item.get("name"))
+        if write_coalescer is not None:
+            # Admitted by the coalescer around the batch this item is written in
+            created_item = await write_coalescer.insert_item(item)
+        else:
+            async with _admitted(admission, db_pool, WRITE):
+                created_item = await insert_item(item, db_pool, category_cache)
         return created_item
+    except AdmissionRejected as e:
+        raise _shed("/items/", "POST", e)
+    except PoolAcquireTimeout as e:
+        raise _pool_exhausted("/items/", "POST", e)
+    except aiomysql.MySQLError as e:
+        REQUEST_ERRORS.inc("/items/", "POST", "mysql")
+        logger.error("Database error occurred: %s", e)
+        raise HTTPException(status_code=500, detail="Database error")
+    except Exception as e:
+        REQUEST_ERRORS.inc("/items/", "POST", "other")
+        logger.error("An error occurred: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.post("/items/bulk", response_model=BulkItemResponse)
+async def create_items_bulk(
+    items: List[dict],
+    db_pool: DatabasePool = Depends(get_db_pool),
+    category_cache: CategoryCache = Depends(get_category_cache),
+    admission: dict = Depends(get_admission_controllers)
+):
+    try:
+        logger.debug("Creating %d items in bulk", len(items))
+        async with _admitted(admission, db_pool, WRITE):
+            results = await insert_items(items, db_pool, category_cache=category_cache)
+        return {"items": results}
+    except AdmissionRejected as e:
+        raise _shed("/items/bulk", "POST", e)
+    except PoolAcquireTimeout as e:
+        raise _pool_exhausted("/items/bulk", "POST", e)
     except aiomysql.MySQLError as e:
+        REQUEST_ERRORS.inc("/items/bulk", "POST", "mysql")
         logger.error("Database error occurred: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
     except Exception as e:
+        REQUEST_ERRORS.inc("/items/bulk", "POST", "other")
         logger.error("An error occurred: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.post("/items/import", response_model=ImportSummary)
+async def import_items_ndjson(
+    request: Request,
+    db_pool: DatabasePool = Depends(get_db_pool),
+    category_cache: CategoryCache = Depends(get_category_cache),
+    admission: dict = Depends(get_admission_controllers)
+):
+    try:
+        # The body is consumed incrementally as newline-delimited JSON, never buffered whole
+        # Each batch is admitted for its write only, not while the client sends the next one
+        summary = await import_items(
+            request.stream(), db_pool, category_cache=category_cache,
+            admit=lambda: _admitted(admission, db_pool, WRITE)
+        )
+        logger.info("Import finished: %s", {key: value for key, value in summary.items() if key != "errors"})
+        return summary
+    except AdmissionRejected as e:
+        raise _shed("/items/import", "POST", e)
+    except PoolAcquireTimeout as e:
+        raise _pool_exhausted("/items/import", "POST", e)
+    except aiomysql.MySQLError as e:
+        REQUEST_ERRORS.inc("/items/import", "POST", "mysql")
+        logger.error("Database error occurred: %s", e)
+        raise HTTPException(status_code=500, detail="Database error")
+    except Exception as e:
+        REQUEST_ERRORS.inc("/items/import", "POST", "other")
+        logger.error("An error occurred: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+async def _encode_item_stream(batches, stream_format: str):
+    """Encode item batches as they arrive, ending with the total price as a trailer."""
+    total_price = Decimal(0)
+    count = 0
+    # Nothing is sent before the first batch, so query errors surface before the response starts.
+    # The separators are orjson's compact ones, so the body matches the non-streamed response
+    separator = b'{"items":[' if stream_format == "json" else b""
+
+    async for items in batches:
+        total_price += sum(item["price"] for item in items)
+        if stream_format == "ndjson":
+            yield b"".join(dumps_json(item) + b"\n" for item in items)
+        else:
+            # The batch's items without the enclosing brackets
+            yield separator + dumps_json(items)[1:-1]
+            separator = b","
+        count += len(items)
+
+    if stream_format == "ndjson":
+        yield dumps_json({"count": count, "total_price": total_price}) + b"\n"
+    else:
+        yield (b'{"items":[' if count == 0 else b"") + b'],"total_price":' + dumps_json(total_price) + b"}"
+
+
+async def _streaming_response(chunks, media_type: str, headers: dict = None):
+    # Run the query before answering so database errors still turn into a 500
+    first_chunk = await chunks.__anext__()
+
+    async def body():
+        try:
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # The status line is already sent; cut the response short
+            REQUEST_ERRORS.inc("/items/", "GET", "mysql" if isinstance(e, aiomysql.MySQLError) else "other")
+            logger.error("Streaming items failed: %s", e)
+            raise
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+
+async def _stream_items(date_range: DateRangeInput, db_pool: DatabasePool, stream_format: str, headers: dict = None,
+                        admission: dict = None):
+    chunks = _encode_item_stream(iter_items_within_date_range(date_range, db_pool), stream_format)
+    chunks = _admitted_chunks(chunks, admission, db_pool, REPORT)
+    media_type = "application/x-ndjson" if stream_format == "ndjson" else "application/json"
+    return await _streaming_response(chunks, media_type, headers)
+
+
+async def _binary_items_response(media_type: str, date_range: DateRangeInput, db_pool: DatabasePool,
+                                 limit: int, page_token: str, totals_only: bool, headers: dict,
+                                 admission: dict = None, priority: int = READ):
+    """MessagePack or Arrow listing encoded straight from the tuple rows, without a dict per row."""
+    if media_type == ARROW_STREAM and limit is None and page_token is None:
+        # A whole range is streamed batch by batch from the server-side cursor
+        rows = iter_items_within_date_range(date_range, db_pool, raw_rows=True)
+        chunks = _admitted_chunks(encode_arrow_stream(rows), admission, db_pool, REPORT)
+        return await _streaming_response(chunks, ARROW_STREAM, headers)
+
+    # Only a query that runs takes a slot, not requests sharing its result
+    items_data = await get_items_within_date_range(
+        date_range, db_pool, limit=limit, page_token=page_token, totals_only=totals_only, raw_rows=True,
+        admit=lambda: _admitted(admission, db_pool, priority)
+    )
+    if media_type == MSGPACK:
+        return MessagePackResponse(items_data, headers=headers)
+
+    # Page details travel in the schema metadata
+    metadata = {
+        key: str(items_data[key]) for key in ("total_price", "next_page_token") if items_data.get(key) is not None
+    }
+    return Response(encode_arrow(items_data.get("items", ()), metadata), media_type=ARROW_STREAM, headers=headers)
+
+
 @app.get("/items/")
-async def query_items_within_date_range(date_range: DateRangeInput, db_pool: aiomysql.Pool = Depends(create_db_pool)):
+async def query_items_within_date_range(
+    request: Request,
+    date_range: DateRangeInput,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    page_token: str = Query(None),
+    stream: Literal["ndjson", "json"] = Query(None),
+    totals_only: bool = Query(False),
+    db_pool: DatabasePool = Depends(get_db_pool),
+    reporting_pool: DatabasePool = Depends(get_reporting_pool),
+    change_watermark: ChangeWatermark = Depends(get_change_watermark),
+    admission: dict = Depends(get_admission_controllers)
+):
+    if stream is not None and not totals_only and (limit is not None or page_token is not None):
+        # A stream always covers the whole range
+        raise HTTPException(status_code=400, detail="stream cannot be combined with limit or page_token")
+
+    # The stream parameter picks the format itself; otherwise the Accept header does
+    media_type = JSON_MEDIA_TYPE
+    if stream is None or totals_only:
+        offered = [
+            offer for offer in available_media_types() if not (totals_only and offer == ARROW_STREAM)
+        ]
+        media_type = negotiate(request.headers.get("accept"), offered)
+        if media_type is None:
+            raise HTTPException(status_code=406, detail=f"Available formats: {', '.join(offered)}")
+
     try:
-        items_data = await get_items_within_date_range(date_range, db_pool)
-        return items_data
+        etag = await _current_etag(
+            change_watermark, db_pool, "items", date_range.dt_from, date_range.dt_to, limit, page_token,
+            stream, totals_only, media_type, admission=admission
+        )
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        headers = {"Vary": "Accept", **(_etag_headers(etag) or {})}
+        # A whole range is a report; pages and totals are ordinary reads
+        priority = REPORT if limit is None and page_token is None and not totals_only else READ
+        # Pages, the first one included, are bounded index reads that never aggregate the range;
+        # whole ranges and totals scan the range on the reporting pool
+        query_pool = reporting_pool if totals_only or (limit is None and page_token is None) else db_pool
+
+        if stream is not None and not totals_only:
+            return await _stream_items(date_range, query_pool, stream, headers=headers, admission=admission)
+        if media_type != JSON_MEDIA_TYPE:
+            return await _binary_items_response(
+                media_type, date_range, query_pool, limit, page_token, totals_only, headers, admission, priority
+            )
+        # Only a query that runs takes a slot, not requests sharing its result
+        items_data = await get_items_within_date_range(
+            date_range, query_pool, limit=limit, page_token=page_token, totals_only=totals_only,
+            admit=lambda: _admitted(admission, query_pool, priority)
+        )
+        return FastJSONResponse(items_data, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionRejected as e:
+        raise _shed("/items/", "GET", e)
+    except PoolAcquireTimeout as e:
+        raise _pool_exhausted("/items/", "GET", e)
     except aiomysql.MySQLError as e:
+        REQUEST_ERRORS.inc("/items/", "GET", "mysql")
         logger.error("Database error occurred: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
     except Exception as e:
+        REQUEST_ERRORS.inc("/items/", "GET", "other")
         logger.error("An error occurred: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+async def _query_category_totals(category: str, db_pool: DatabasePool, admission: dict = None) -> list:
+    # Totals across every category are a report
+    priority = REPORT if category == "all" else READ
+    logger.debug("Before acquiring database connection")
+
+    async with _admitted(admission, db_pool, priority), db_pool.acquire() as conn:
+        async with conn.cursor(aiomysql.cursors.DictCursor) as cursor:
+            logger.debug("Database connection acquired")
+            if category == "all":
+                statement = statements.CATEGORY_TOTALS_ALL
+                params = ()
+            else:
+                statement = statements.CATEGORY_TOTALS_ONE
+                params = (category,)
+
+            await statement.execute(cursor, params)
+            return await statement.fetchall(cursor)
+
+
 @app.get("/items-by-category/")
 async def query_items_by_category(
+    request: Request,
     category_input: CategoryInput = None,
     category: str = Query(None),
-    db_pool: aiomysql.Pool = Depends(create_db_pool)
+    db_pool: DatabasePool = Depends(get_db_pool),
+    reporting_pool: DatabasePool = Depends(get_reporting_pool),
+    category_cache: CategoryCache = Depends(get_category_cache),
+    change_watermark: ChangeWatermark = Depends(get_change_watermark),
+    admission: dict = Depends(get_admission_controllers)
 ):
     try:
         if category_input is not None:
             category = category_input.category.lower()
 
-        logger.debug("Before acquiring database connection")
+        etag = await _current_etag(change_watermark, db_pool, "items-by-category", category, admission=admission)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
 
-        async with db_pool.acquire() as conn:
-            async with conn.cursor(aiomysql.cursors.DictCursor) as cursor:
-                logger.debug("Database connection acquired")
-                if category == "all":
-                    query = "SELECT category, SUM(price) AS total_price, ROW_NUMBER() OVER () AS count FROM items GROUP BY category"
-                    params = ()
-                else:
-                    query = "SELECT category, SUM(price) AS total_price, ROW_NUMBER() OVER () AS count FROM items WHERE category = %s GROUP BY category"
-                    params = (category,)
+        cache_key = ALL_CATEGORIES if category == "all" else category
+        items = MISSING
+        if category_cache is not None and cache_key is not None:
+            items = category_cache.get(cache_key)
+            generation = category_cache.generation
 
-                await cursor.execute(query, params)
-                items = await cursor.fetchall()
+        if items is MISSING:
+            # A single category is a primary key read; every category at once is an aggregate
+            query_pool = reporting_pool if category == "all" else db_pool
+            # Requests for the same category, e.g. after its cache entry expired, share one query,
+            # and only that query takes an admission slot
+            items = await read_flights.do(
+                ("category", id(query_pool), write_count(), category),
+                lambda: _query_category_totals(category, query_pool, admission)
+            )
+            if category_cache is not None and cache_key is not None:
+                category_cache.put(cache_key, items, generation)
 
-                return {"items": items} if items else {"message": f"No items found for category: {category}"}
+        content = {"items": items} if items else {"message": f"No items found for category: {category}"}
+        return FastJSONResponse(content, headers=_etag_headers(etag))
 
+    except AdmissionRejected as e:
+        raise _shed("/items-by-category/", "GET", e)
+    except PoolAcquireTimeout as e:
+        raise _pool_exhausted("/items-by-category/", "GET", e)
     except aiomysql.MySQLError as e:
+        REQUEST_ERRORS.inc("/items-by-category/", "GET", "mysql")
         logger.error("Database error occurred: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
+    except Exception as e:
+        REQUEST_ERRORS.inc("/items-by-category/", "GET", "other")
+        logger.error("An error occurred: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/category-cache")
+async def category_cache_stats(category_cache: CategoryCache = Depends(get_category_cache)):
+    if category_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **category_cache.stats()}
+
+
+@app.get("/admin/admission")
+async def admission_stats(admission: dict = Depends(get_admission_controllers)):
+    if not admission:
+        return {"enabled": False}
+    return {"enabled": True, "pools": {name: controller.stats() for name, controller in admission.items()}}
+
+
+@app.get("/admin/write-coalescing")
+async def write_coalescing_stats(write_coalescer: WriteCoalescer = Depends(get_write_coalescer)):
+    if write_coalescer is None:
+        return {"enabled": False}
+    return {"enabled": True, **write_coalescer.stats()}
+
+
+@app.get("/admin/read-coalescing")
+async def read_coalescing_stats():
+    return read_flights.stats()
+
+
+@app.get("/admin/slow-queries")
+async def slow_query_log(reporting_pool: DatabasePool = Depends(get_reporting_pool)):
+    try:
+        await slow_queries.explain_pending(reporting_pool)
+    except (aiomysql.MySQLError, PoolAcquireTimeout) as e:
+        # The captures are still worth returning without their plans
+        logger.error("Could not explain slow queries: %s", e)
+    return FastJSONResponse({
+        "threshold": slow_queries.threshold,
+        "captured": slow_queries.captured,
+        "entries": slow_queries.entries(),
+    })
 
 
 if __name__ == "__main__":
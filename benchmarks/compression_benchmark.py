@@ -0,0 +1,68 @@
+"""
+CPU time against bytes saved when compressing a GET /items/ response of 100k items, for gzip
+and zstd at several levels, both in one go and in the 1000-row chunks of a streamed listing
+(flushed after every chunk, as CompressionMiddleware does). Needs no database:
+
+    python -m benchmarks.compression_benchmark --rows 100000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api_operations.compression import _GzipEncoder, _ZstdEncoder, zstandard
+from api_operations.responses import FastJSONResponse
+
+
+def make_chunks(rows: int, chunk_rows: int) -> list:
+    updated = datetime(2024, 1, 1)
+    items = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"item-{n}",
+            "category": f"category-{n % 50}",
+            "price": Decimal("9.99"),
+            "last_updated_dt": updated,
+        }
+        for n in range(rows)
+    ]
+    return [FastJSONResponse(items[start:start + chunk_rows]).body for start in range(0, rows, chunk_rows)]
+
+
+def measure(encoder_class, level: int, chunks: list) -> tuple:
+    started = time.process_time()
+    encoder = encoder_class(level)
+    compressed = sum(len(encoder.compress(chunk)) for chunk in chunks[:-1]) + len(encoder.finish(chunks[-1]))
+    return time.process_time() - started, compressed
+
+
+def main(rows: int):
+    streamed = make_chunks(rows, 1000)
+    whole = [b"".join(streamed)]
+    size = len(whole[0])
+    print(f"{rows} items, {size / 1e6:.1f} MB uncompressed")
+
+    codecs = [(_GzipEncoder, "gzip", level) for level in (1, 5, 9)]
+    if zstandard is not None:
+        codecs += [(_ZstdEncoder, "zstd", level) for level in (1, 3, 10)]
+
+    print(f"{'codec':<8} {'level':>5}  {'mode':<8} {'CPU (ms)':>9}  {'MB/s':>7}  {'ratio':>6}")
+    for encoder_class, name, level in codecs:
+        for mode, chunks in (("whole", whole), ("streamed", streamed)):
+            cpu, compressed = measure(encoder_class, level, chunks)
+            print(
+                f"{name:<8} {level:>5}  {mode:<8} {cpu * 1000:>9.1f}  {size / 1e6 / cpu:>7.0f}  "
+                f"{size / compressed:>5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Items in the response")
+    args = parser.parse_args()
+    main(args.rows)
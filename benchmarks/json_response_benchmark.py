@@ -0,0 +1,55 @@
+"""
+Rendering GET /items/ responses of 1k, 10k and 100k items: FastAPI's default path, where
+jsonable_encoder walks the content before JSONResponse runs json.dumps, versus FastJSONResponse,
+which orjson renders in one pass. Needs no database:
+
+    python -m benchmarks.json_response_benchmark --repeat 3
+"""
+import argparse
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from api_operations.responses import FastJSONResponse
+
+
+def make_content(rows: int) -> dict:
+    # The shape get_items_within_date_range returns
+    updated = datetime(2024, 1, 1)
+    items = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"item-{n}",
+            "category": f"category-{n % 50}",
+            "price": Decimal("9.99"),
+            "last_updated_dt": updated,
+        }
+        for n in range(rows)
+    ]
+    return {"items": items, "total_price": Decimal("9.99") * rows}
+
+
+def main(sizes: list, repeat: int):
+    print(f"{'rows':>8}  {'default (ms)':>13}  {'fast (ms)':>10}  {'speedup':>8}")
+    for rows in sizes:
+        content = make_content(rows)
+        assert JSONResponse(jsonable_encoder(content)).body == FastJSONResponse(content).body
+
+        default = min(timeit.repeat(lambda: JSONResponse(jsonable_encoder(content)), number=1, repeat=repeat))
+        fast = min(timeit.repeat(lambda: FastJSONResponse(content), number=1, repeat=repeat))
+        print(f"{rows:>8}  {default * 1000:>13.1f}  {fast * 1000:>10.1f}  {default / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Items per response")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the fastest is reported")
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
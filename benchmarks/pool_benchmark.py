@@ -0,0 +1,68 @@
+"""
+Requests/sec for GET /items-by-category/ with a pool created per request (the old
+``Depends(create_db_pool)`` behaviour) versus the application-lifetime shared pool.
+
+Requires the MySQL container from the README to be running:
+
+    python -m benchmarks.pool_benchmark --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+
+from app import app
+from database_operations.database import create_db_pool, close_db_pool, get_db_pool
+
+
+async def _run(client: httpx.AsyncClient, total: int, concurrency: int) -> float:
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            response = await client.get("/items-by-category/", params={"category": "all"})
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(total: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Before: a brand-new pool for every request. The old code never closed it;
+        # here it is closed afterwards so the run does not exhaust max_connections.
+        async def pool_per_request():
+            pool = await create_db_pool()
+            try:
+                yield pool
+            finally:
+                await close_db_pool(pool)
+
+        app.dependency_overrides[get_db_pool] = pool_per_request
+        before = await _run(client, total, concurrency)
+        app.dependency_overrides.clear()
+
+        # After: one pool for the lifetime of the application
+        app.state.db_pool = await create_db_pool()
+        try:
+            after = await _run(client, total, concurrency)
+        finally:
+            await close_db_pool(app.state.db_pool)
+
+    print(f"pool per request: {before:10.1f} req/s")
+    print(f"shared pool:      {after:10.1f} req/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
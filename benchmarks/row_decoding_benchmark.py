@@ -0,0 +1,67 @@
+"""
+Decoding 100k item rows: the previous per-row, per-key isinstance/UUID loop over DictCursor
+dicts versus RowDecoder over tuple rows whose id MySQL already formatted with BIN_TO_UUID.
+A third variant shows the cost of converting the id in Python instead. Needs no database:
+
+    python -m benchmarks.row_decoding_benchmark --rows 100000
+"""
+import argparse
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database_operations.decoders import ITEM_ROW
+
+
+def decode_per_key(items):
+    # The loop get_items_within_date_range used to run
+    for item in items:
+        for key, value in item.items():
+            if isinstance(value, bytes):
+                try:
+                    item[key] = uuid.UUID(bytes=value)
+                except ValueError:
+                    item[key] = "Invalid encoding"
+    return items
+
+
+def main(rows: int, repeat: int):
+    updated = datetime(2024, 1, 1)
+    binary_rows = [
+        (uuid.uuid4().bytes, f"item-{n}", f"category-{n % 50}", Decimal("9.99"), updated)
+        for n in range(rows)
+    ]
+    # What the listing statements now receive from MySQL
+    string_rows = [(str(uuid.UUID(bytes=row[0])), *row[1:]) for row in binary_rows]
+
+    # DictCursor builds the dicts itself; include that cost since RowDecoder replaces it
+    def old_path():
+        return decode_per_key([dict(zip(ITEM_ROW.columns, row)) for row in binary_rows])
+
+    def python_conversion():
+        return ITEM_ROW.decode_rows((uuid.UUID(bytes=row[0]), *row[1:]) for row in binary_rows)
+
+    def sql_conversion():
+        return ITEM_ROW.decode_rows(string_rows)
+
+    paths = (
+        ("per-key loop", old_path),
+        ("uuid in Python", python_conversion),
+        ("BIN_TO_UUID", sql_conversion),
+    )
+    for name, path in paths:
+        best = min(timeit.repeat(path, number=1, repeat=repeat))
+        print(f"{name:<15} {best * 1000:8.1f} ms for {rows:,} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,75 @@
+"""
+Insert throughput into a binary(16) clustered primary key with random (uuid4) versus
+time-ordered (uuid7) ids.
+
+Each generator fills its own copy of the items table and reports rows/sec for every
+reporting interval, so the slowdown once the table outgrows the buffer pool is visible.
+Requires the MySQL container from the README to be running:
+
+    python -m benchmarks.uuid_insert_benchmark --rows 10000000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import aiomysql
+
+from database_operations.database import DATABASE_CONFIG
+from database_operations.ids import uuid7
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+async def fill(conn, table: str, generate, rows: int, batch: int, report_every: int):
+    async with conn.cursor() as cursor:
+        await cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        await cursor.execute(f"CREATE TABLE {table} LIKE items")
+
+        values = ", ".join(["(%s, %s, %s, %s)"] * batch)
+        sql = f"INSERT INTO {table} (id, name, category, price) VALUES {values}"
+
+        inserted = 0
+        # Batches need not divide report_every, so report on crossing each multiple of it
+        next_report = report_every
+        interval_rows = 0
+        interval_start = time.perf_counter()
+        while inserted < rows:
+            params = []
+            for n in range(inserted, inserted + batch):
+                params.extend((generate().bytes, f"item-{n}", f"category-{n % 50}", "9.99"))
+            await cursor.execute(sql, params)
+            await conn.commit()
+            inserted += batch
+
+            if inserted >= next_report:
+                elapsed = time.perf_counter() - interval_start
+                print(f"{table}: {inserted:>12,} rows  {(inserted - interval_rows) / elapsed:10.0f} rows/s")
+                interval_rows = inserted
+                interval_start = time.perf_counter()
+                while next_report <= inserted:
+                    next_report += report_every
+
+        await cursor.execute(f"DROP TABLE {table}")
+
+
+async def main(rows: int, batch: int, report_every: int):
+    conn = await aiomysql.connect(**DATABASE_CONFIG)
+    try:
+        for name, generate in GENERATORS.items():
+            await fill(conn, f"items_bench_{name}", generate, rows, batch, report_every)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--report-every", type=int, default=1_000_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.batch, args.report_every))
@@ -0,0 +1,106 @@
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+
+# A TTL of 0 disables the cache. Writes made by this process invalidate entries immediately;
+# the TTL bounds how long writes made by other processes can go unnoticed.
+CATEGORY_CACHE_CONFIG = {
+    "ttl": float(os.getenv("CATEGORY_CACHE_TTL", "2")),
+    "max_entries": int(os.getenv("CATEGORY_CACHE_MAX_ENTRIES", "1024")),
+}
+
+# Key of the category=all result, distinct from any category name
+ALL_CATEGORIES = object()
+
+# Returned by get() on a miss, since an empty result is a valid cached value
+MISSING = object()
+
+
+def normalize_category(category: str) -> str:
+    """
+    Fold a category the way MySQL's utf8mb4_0900_ai_ci collation compares it, ignoring case and
+    accents, so that every spelling sharing a summary row shares a cache entry.
+    """
+    decomposed = unicodedata.normalize("NFKD", category)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+class CategoryCache:
+    """
+    Bounded cache of category aggregates with a TTL and least-recently-used eviction.
+
+    A read that misses should take the generation before querying and pass it to put(); if a
+    write invalidated anything in the meantime the result may predate it and is not stored.
+    """
+
+    def __init__(self, ttl: float = CATEGORY_CACHE_CONFIG["ttl"],
+                 max_entries: int = CATEGORY_CACHE_CONFIG["max_entries"], clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self.generation = 0
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _key(category):
+        return category if category is ALL_CATEGORIES else normalize_category(category)
+
+    def get(self, category):
+        key = self._key(category)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.metrics["misses"] += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.metrics["expirations"] += 1
+            self.metrics["misses"] += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        self.metrics["hits"] += 1
+        return value
+
+    def put(self, category, value, generation: int = None):
+        if generation is not None and generation != self.generation:
+            return
+
+        key = self._key(category)
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+
+    def invalidate(self, categories):
+        """Drop the given categories and the all-categories result."""
+        self.generation += 1
+        self.metrics["invalidations"] += 1
+        for category in categories:
+            self._entries.pop(self._key(category), None)
+        self._entries.pop(ALL_CATEGORIES, None)
+
+    def clear(self):
+        self.generation += 1
+        self.metrics["invalidations"] += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hit_ratio": self.metrics["hits"] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,185 @@
+"""
+Per-category item count and total price, kept in item_category_summary.
+
+Triggers on items adjust the summary in the same transaction as every insert, update (including
+a move to another category) and delete, whichever code path writes the row. The category
+endpoint then reads one summary row per category instead of aggregating the whole items table.
+
+    python -m database_operations.category_summary verify
+    python -m database_operations.category_summary rebuild
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import aiomysql
+from .cache import normalize_category
+from .database import DATABASE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS item_category_summary ("
+    "category varchar(255) NOT NULL, "
+    "item_count int NOT NULL, "
+    "total_price decimal(20,2) NOT NULL, "
+    "last_updated_dt timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+    "PRIMARY KEY (category)"
+    ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci"
+)
+
+# Each trigger is a single multi-row upsert of deltas. On update, the old category is debited
+# and the new one credited; when both are the same row the deltas net out.
+_APPLY_DELTAS = (
+    "INSERT INTO item_category_summary (category, item_count, total_price) VALUES {deltas} AS delta "
+    "ON DUPLICATE KEY UPDATE item_count = item_count + delta.item_count, "
+    "total_price = total_price + delta.total_price"
+)
+
+# The triggers as created by migration 5. Shipped migrations must keep doing what they did, so
+# later changes go into TRIGGERS and are applied by a new migration with replace_changed_triggers.
+INITIAL_TRIGGERS = {
+    "items_category_summary_insert": (
+        "AFTER INSERT", _APPLY_DELTAS.format(deltas="(NEW.category, 1, NEW.price)")
+    ),
+    "items_category_summary_update": (
+        "AFTER UPDATE", _APPLY_DELTAS.format(deltas="(OLD.category, -1, -OLD.price), (NEW.category, 1, NEW.price)")
+    ),
+    "items_category_summary_delete": (
+        "AFTER DELETE", _APPLY_DELTAS.format(deltas="(OLD.category, -1, -OLD.price)")
+    ),
+}
+
+# The current triggers, as in init.sql. The update trigger also leaves the old category in
+# @items_prev_category so the writer can invalidate caches of it (migration 6).
+TRIGGERS = {
+    **INITIAL_TRIGGERS,
+    "items_category_summary_update": (
+        "AFTER UPDATE",
+        "BEGIN SET @items_prev_category = OLD.category; "
+        + _APPLY_DELTAS.format(deltas="(OLD.category, -1, -OLD.price), (NEW.category, 1, NEW.price)")
+        + "; END"
+    ),
+}
+
+
+def _normalize(body: str) -> str:
+    # information_schema keeps a trigger body as it was written, e.g. by init.sql with quoted
+    # identifiers and line breaks, so compare bodies ignoring quoting, whitespace and case
+    return " ".join(body.replace("`", "").split()).casefold()
+
+
+def create_category_summary(triggers: dict):
+    """Migration step creating the summary table and triggers if missing, then populating it."""
+
+    async def step(conn, cursor):
+        await cursor.execute(CREATE_TABLE_SQL)
+        for name, (timing, body) in triggers.items():
+            await cursor.execute(
+                "SELECT 1 FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s",
+                (name,)
+            )
+            if await cursor.fetchone() is None:
+                logger.info("Creating trigger %s", name)
+                await cursor.execute(f"CREATE TRIGGER {name} {timing} ON items FOR EACH ROW {body}")
+        await rebuild_category_summary(conn)
+
+    return step
+
+
+def replace_changed_triggers(triggers: dict):
+    """Migration step recreating any of the given triggers whose body differs from the database's."""
+
+    async def step(conn, cursor):
+        for name, (timing, body) in triggers.items():
+            await cursor.execute(
+                "SELECT ACTION_STATEMENT FROM information_schema.TRIGGERS "
+                "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s",
+                (name,)
+            )
+            row = await cursor.fetchone()
+            if row is not None and _normalize(row[0]) == _normalize(body):
+                continue
+
+            # Writes are held off so none can slip through without a trigger
+            logger.info("Replacing trigger %s", name)
+            await cursor.execute("LOCK TABLES items WRITE, item_category_summary WRITE")
+            try:
+                await cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                await cursor.execute(f"CREATE TRIGGER {name} {timing} ON items FOR EACH ROW {body}")
+            finally:
+                await cursor.execute("UNLOCK TABLES")
+
+    return step
+
+
+async def rebuild_category_summary(conn):
+    """
+    Recompute the summary from items.
+
+    Writes to items are blocked while the aggregate runs so that no change slips in between
+    reading items and replacing the summary.
+    """
+    async with conn.cursor() as cursor:
+        await cursor.execute("LOCK TABLES items READ, item_category_summary WRITE")
+        try:
+            await cursor.execute("DELETE FROM item_category_summary")
+            await cursor.execute(
+                "INSERT INTO item_category_summary (category, item_count, total_price, last_updated_dt) "
+                "SELECT category, COUNT(*), SUM(price), MAX(last_updated_dt) FROM items GROUP BY category"
+            )
+            await conn.commit()
+        finally:
+            await cursor.execute("UNLOCK TABLES")
+
+
+async def verify_category_summary(conn) -> list:
+    """Compare the summary with a fresh aggregate of items and describe every difference."""
+    # Both sides are keyed like the accent- and case-insensitive column collation, since the
+    # GROUP BY and the summary row may each have kept a different spelling of a category
+    async with conn.cursor() as cursor:
+        await cursor.execute("SELECT category, COUNT(*), SUM(price) FROM items GROUP BY category")
+        expected = {normalize_category(category): (category, count, total) for category, count, total in await cursor.fetchall()}
+        await cursor.execute(
+            "SELECT category, item_count, total_price FROM item_category_summary "
+            "WHERE item_count <> 0 OR total_price <> 0"
+        )
+        actual = {normalize_category(category): (category, count, total) for category, count, total in await cursor.fetchall()}
+
+    problems = []
+    for key in sorted(expected.keys() | actual.keys()):
+        category, expected_count, expected_total = expected.get(key, (actual.get(key, (key,))[0], 0, 0))
+        _, actual_count, actual_total = actual.get(key, (category, 0, 0))
+        if (expected_count, expected_total) != (actual_count, actual_total):
+            problems.append(
+                f"{category}: items has {expected_count} items totalling {expected_total}, "
+                f"summary has {actual_count} totalling {actual_total}"
+            )
+    return problems
+
+
+async def main(command: str) -> int:
+    conn = await aiomysql.connect(**DATABASE_CONFIG)
+    try:
+        if command == "rebuild":
+            await rebuild_category_summary(conn)
+            print("Category summary rebuilt")
+            return 0
+
+        problems = await verify_category_summary(conn)
+        for problem in problems:
+            print(problem)
+        if problems:
+            return 1
+        print("Category summary matches items")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.command)))
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import aiomysql
+from pymysql.constants.ER import LOCK_DEADLOCK
+from .cache import CategoryCache
+from .crud import _admit, _lock_order, _validate_item, _upsert_item
+from .metrics import Counter, Histogram
+from .watermark import record_write
+
+logger = logging.getLogger(__name__)
+
+# Write coalescing is opt-in; the other settings only apply when it is enabled
+COALESCER_CONFIG = {
+    "enabled": os.getenv("DB_WRITE_COALESCING", "0").lower() in ("1", "true", "yes"),
+    "max_batch_size": int(os.getenv("DB_WRITE_COALESCING_MAX_BATCH", "50")),
+    "max_delay": float(os.getenv("DB_WRITE_COALESCING_MAX_DELAY_MS", "2")) / 1000,
+}
+
+# Times a batch chosen as a deadlock victim is rolled back and written again before its callers
+# get the error
+MAX_DEADLOCK_RETRIES = 3
+
+WRITE_COALESCING_BATCH_SIZE = Histogram(
+    "write_coalescing_batch_size", "Writes grouped into each coalesced transaction.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200)
+)
+WRITE_COALESCING_QUEUE_WAIT_SECONDS = Histogram(
+    "write_coalescing_queue_wait_seconds", "Time writes waited in the coalescing queue before their batch was flushed."
+)
+WRITE_COALESCING_RETRIES = Counter(
+    "write_coalescing_retries_total", "Coalesced transactions rolled back and retried without a failing row."
+)
+WRITE_COALESCING_DEADLOCK_RETRIES = Counter(
+    "write_coalescing_deadlock_retries_total", "Coalesced transactions written again after losing a deadlock."
+)
+
+
+class WriteCoalescer:
+    """
+    Group commit for concurrent single-item writes.
+
+    Calls to insert_item() are queued until max_batch_size items are waiting or max_delay seconds
+    have passed since the first one, then written in a single transaction with one commit. Each
+    caller gets back its own id, or its own exception if its row was rejected. The categories
+    touched by a committed batch are invalidated in category_cache.
+
+    admit, if given, returns an async context manager held around each batch's write, so callers
+    waiting for their batch to be flushed hold nothing.
+    """
+
+    def __init__(self, db_pool, max_batch_size: int = COALESCER_CONFIG["max_batch_size"],
+                 max_delay: float = COALESCER_CONFIG["max_delay"], category_cache: CategoryCache = None,
+                 admit=None):
+        self._db_pool = db_pool
+        self._category_cache = category_cache
+        self._admit = admit
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+        self.metrics = {
+            "batches": 0,
+            "items": 0,
+            "max_batch_size": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "retries": 0,
+            "deadlock_retries": 0,
+        }
+
+    async def insert_item(self, item: dict) -> dict:
+        # Validation errors go straight back to the caller without joining a batch
+        row = _validate_item(item)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future, loop.time()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: list):
+        now = asyncio.get_running_loop().time()
+        waits = [now - enqueued_at for _, _, enqueued_at in batch]
+        self.metrics["batches"] += 1
+        self.metrics["items"] += len(batch)
+        self.metrics["max_batch_size"] = max(self.metrics["max_batch_size"], len(batch))
+        self.metrics["queue_wait_seconds_total"] += sum(waits)
+        self.metrics["queue_wait_seconds_max"] = max(self.metrics["queue_wait_seconds_max"], max(waits))
+        WRITE_COALESCING_BATCH_SIZE.observe(len(batch))
+        for wait in waits:
+            WRITE_COALESCING_QUEUE_WAIT_SECONDS.observe(wait)
+
+        # Callers that went away no longer need their row written. The rest are written in the same
+        # lock order as bulk writes, so concurrent batches cannot lock categories in opposite orders;
+        # the sort is stable, so the last write to a name still wins
+        batch = sorted((entry for entry in batch if not entry[1].done()), key=lambda entry: _lock_order(entry[0]))
+
+        deadlocks = 0
+        try:
+            async with _admit(self._admit), self._db_pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    while batch:
+                        try:
+                            batch = await self._write_transaction(conn, cursor, batch)
+                        except aiomysql.OperationalError as e:
+                            if e.args[0] != LOCK_DEADLOCK or deadlocks >= MAX_DEADLOCK_RETRIES:
+                                raise
+                            # InnoDB rolled the whole transaction back; no row is to blame
+                            deadlocks += 1
+                            self.metrics["deadlock_retries"] += 1
+                            WRITE_COALESCING_DEADLOCK_RETRIES.inc()
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _write_transaction(self, conn, cursor, batch: list) -> list:
+        """
+        Write the batch in one transaction and resolve its futures.
+
+        If a row fails, the transaction is rolled back, that caller gets the error and the rows
+        still to be written are returned so they can be retried without it. A deadlock is raised
+        instead, after the rollback, since the whole batch has to be written again.
+        """
+        results = []
+        touched_categories = set()
+        await conn.begin()
+        for index, (row, future, _) in enumerate(batch):
+            try:
+                results.append(await _upsert_item(cursor, row, touched_categories))
+            except Exception as e:  # Not only MySQLError: one bad row must not fail the whole batch
+                await conn.rollback()
+                if isinstance(e, aiomysql.OperationalError) and e.args[0] == LOCK_DEADLOCK:
+                    raise
+                if not future.done():
+                    future.set_exception(e)
+                self.metrics["retries"] += 1
+                WRITE_COALESCING_RETRIES.inc()
+                return batch[:index] + batch[index + 1:]
+
+        await conn.commit()
+        record_write()
+        if self._category_cache is not None and touched_categories:
+            self._category_cache.invalidate(touched_categories)
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        return []
+
+    def stats(self) -> dict:
+        batches = self.metrics["batches"]
+        items = self.metrics["items"]
+        return {
+            **self.metrics,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "mean_queue_wait_seconds": self.metrics["queue_wait_seconds_total"] / items if items else 0.0,
+        }
+
+    async def close(self):
+        """Write whatever is still queued and wait for in-flight batches."""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
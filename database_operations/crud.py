@@ -1,73 +1,450 @@
 import aiomysql
+import base64
+import contextlib
+import json
+import logging
 import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from .cache import CategoryCache, normalize_category
+from .decoders import ITEM_ROW
+from .ids import uuid7
 from .models import DateRangeInput
+from .singleflight import SingleFlight
+from .watermark import record_write, write_count
+from . import statements
 
-async def insert_item(item: dict, db_pool: aiomysql.Pool):
+logger = logging.getLogger(__name__)
+
+# Identical reads in flight at the same time share one query
+read_flights = SingleFlight()
+
+# Rows written per transaction by insert_items and import_items
+BULK_CHUNK_SIZE = 500
+
+# Longest NDJSON record accepted by import_items, so a missing newline cannot exhaust memory
+MAX_IMPORT_LINE_BYTES = 64 * 1024
+
+# Failed records reported individually in an import summary; the rest are only counted
+MAX_IMPORT_ERRORS_REPORTED = 100
+
+# Page sizes for get_items_within_date_range
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched from the server-side cursor per round trip when streaming
+STREAM_BATCH_SIZE = 1000
+
+# Precision and range of the items.price DECIMAL(12,2) column
+PRICE_QUANTUM = Decimal("0.01")
+MAX_PRICE = Decimal("9999999999.99")
+
+# Length of the items.name and items.category VARCHAR(255) columns
+MAX_TEXT_LENGTH = 255
+
+def _validate_item(item: dict) -> tuple:
+    """Check an item payload and return its (name, category, price) column values."""
+    if not isinstance(item, dict) or not all(key in item for key in ('name', 'category', 'price')):
+        raise ValueError("Item dictionary must contain 'name', 'category', and 'price' keys")
+
+    for key in ("name", "category"):
+        value = item[key]
+        if not isinstance(value, str) or not value.strip() or len(value) > MAX_TEXT_LENGTH:
+            raise ValueError(f"Invalid {key}: must be a non-empty string of at most {MAX_TEXT_LENGTH} characters")
+
+    # Prices are stored as DECIMAL(12,2); str() keeps floats from leaking binary rounding error
+    try:
+        price = Decimal(str(item["price"])).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValueError(f"Invalid price: {item['price']!r}")
+    if not price.is_finite() or abs(price) > MAX_PRICE:
+        raise ValueError(f"Invalid price: {item['price']!r}")
+
+    return item["name"], item["category"], price
+
+
+async def _upsert_item(cursor, row: tuple, touched_categories: set = None) -> dict:
+    """
+    Upsert one validated (name, category, price) row without committing and return its id.
+
+    The categories whose aggregates the write changed, both the old and the new one when an item
+    moves, are added to touched_categories.
+    """
+    name, category, price = row
+
+    # Insert the item, or update the row that already has this name, in one round trip.
+    # The unique index on items.name resolves the conflict atomically in MySQL.
+    new_item_id = uuid7()
+    await statements.ITEMS_UPSERT.execute(
+        cursor, (new_item_id.bytes, name, category, price), sql=statements.ITEMS_UPSERT.format(values="(%s, %s, %s, %s)")
+    )
+
+    if cursor.rowcount == 1:
+        # A new row was inserted with our id
+        if touched_categories is not None:
+            touched_categories.add(category)
+        return {"id": str(new_item_id)}
+
+    updated = cursor.rowcount == 2
+    # rowcount is 2 when an existing item was updated and 0 when it already had these
+    # values; either way the row keeps its original id, found through the unique index
+    await statements.ITEM_ID_AND_PREVIOUS_CATEGORY_BY_NAME.execute(cursor, (name,))
+    existing_item = await statements.ITEM_ID_AND_PREVIOUS_CATEGORY_BY_NAME.fetchone(cursor)
+    if updated and touched_categories is not None:
+        touched_categories.add(category)
+        # NULL until migration 6 installs the trigger that records it; the old category's
+        # cache entry then only expires with its TTL
+        if existing_item[1] is not None:
+            touched_categories.add(existing_item[1])
+    return {"id": existing_item[0].hex()}  # Convert bytes to hex string
+
+
+async def insert_item(item: dict, db_pool: aiomysql.Pool, category_cache: CategoryCache = None):
     conn = await db_pool.acquire()
     try:
         cursor = await conn.cursor()
 
         # Validate input data
-        if not all(key in item for key in ('name', 'category', 'price')):
-            raise ValueError("Item dictionary must contain 'name', 'category', and 'price' keys")
+        row = _validate_item(item)
 
-        # Check if an item with the same name already exists
-        await cursor.execute(
-            "SELECT id, price FROM items WHERE name = %s", (item['name'],)
-        )
-        existing_item = await cursor.fetchone()
-
-        if existing_item:
-            # Update existing item
-            existing_item_id = existing_item[0]
-            await cursor.execute(
-                "UPDATE items SET category = %s, price = %s WHERE id = %s",
-                (item["category"], "{:.2f}".format(float(item["price"])), existing_item_id)
-            )
-            await conn.commit()
-            return {"id": existing_item_id.hex()}  # Convert bytes to hex string
-        else:
-            # Insert new item
-            new_item_id = uuid.uuid4()
-            new_item_id_bytes = new_item_id.bytes
-            await cursor.execute(
-                "INSERT INTO items (id, name, category, price) VALUES (%s, %s, %s, %s)",
-                (new_item_id_bytes, item["name"], item["category"], "{:.2f}".format(float(item["price"])))
-            )
-            await conn.commit()
-            return {"id": str(new_item_id)}
+        await conn.begin()
+        touched_categories = set()
+        created_item = await _upsert_item(cursor, row, touched_categories)
+        await conn.commit()
+        record_write()
+        # Only after the commit, so a concurrent read cannot cache the old aggregate again
+        if category_cache is not None and touched_categories:
+            category_cache.invalidate(touched_categories)
+        return created_item
     except Exception as e:
         await conn.rollback()  # Rollback changes in case of error
         raise e
     finally:
         await db_pool.release(conn)
 
-async def get_items_within_date_range(date_range: DateRangeInput, db_pool: aiomysql.Pool):
+
+async def _upsert_rows(cursor, rows: list):
+    """Upsert (name, category, price) rows with one multi-row statement."""
+    params = []
+    for name, category, price in rows:
+        params.extend((uuid7().bytes, name, category, price))
+    await statements.ITEMS_UPSERT.execute(
+        cursor, params, sql=statements.ITEMS_UPSERT.format(values=", ".join(["(%s, %s, %s, %s)"] * len(rows)))
+    )
+
+
+async def _upsert_chunk(cursor, rows: list) -> dict:
+    """
+    Upsert (name, category, price) rows and return a mapping of casefolded name to the id of
+    the stored row.
+    """
+    await _upsert_rows(cursor, rows)
+
+    # Read back the ids, including those of rows that already existed
+    names = [name for name, _, _ in rows]
+    await statements.ITEM_IDS_BY_NAMES.execute(
+        cursor, names, sql=statements.ITEM_IDS_BY_NAMES.format(names=", ".join(["%s"] * len(names)))
+    )
+    ids = {
+        stored_name.casefold(): item_id for item_id, stored_name in await statements.ITEM_IDS_BY_NAMES.fetchall(cursor)
+    }
+
+    # The column collation is accent-insensitive too, so fall back to the unique index for
+    # any name whose stored spelling differs from the requested one
+    for name in names:
+        if name.casefold() not in ids:
+            await statements.ITEM_ID_BY_NAME.execute(cursor, (name,))
+            ids[name.casefold()] = (await statements.ITEM_ID_BY_NAME.fetchone(cursor))[0]
+    return ids
+
+
+def _admit(admit):
+    return admit() if admit is not None else contextlib.nullcontext()
+
+
+def _lock_order(row: tuple) -> tuple:
+    # Writes lock the item_category_summary row of each category before the next item row, so
+    # grouping by category keeps concurrent batches from locking categories in opposite orders.
+    # Categories are folded like the column collation, so spellings sharing a summary row sort together.
+    name, category, _ = row
+    return normalize_category(category), name.casefold()
+
+
+async def insert_items(items: list, db_pool: aiomysql.Pool, chunk_size: int = BULK_CHUNK_SIZE,
+                       category_cache: CategoryCache = None) -> list:
+    """
+    Validate and upsert many items, writing them in chunked transactions of multi-row statements.
+
+    Returns one {"id": ...} or {"error": ...} entry per input item, in input order. Items sharing a
+    name collapse into one row where the last occurrence wins. Rows are written sorted by category
+    and name so concurrent bulk loads take summary and row locks in the same order.
+
+    The previous categories of updated rows are not read back, so every committed chunk clears
+    category_cache entirely.
+    """
+    results = [None] * len(items)
+
+    # Validate everything up front; a later occurrence of a name replaces an earlier one
+    rows = {}
+    positions = {}
+    for index, item in enumerate(items):
+        try:
+            name, category, price = _validate_item(item)
+        except ValueError as e:
+            results[index] = {"error": str(e)}
+            continue
+        key = name.casefold()
+        rows[key] = (name, category, price)
+        positions.setdefault(key, []).append(index)
+
+    ordered_keys = sorted(rows, key=lambda key: _lock_order(rows[key]))
+    if not ordered_keys:
+        return results
+
+    async with db_pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            for start in range(0, len(ordered_keys), chunk_size):
+                chunk_keys = ordered_keys[start:start + chunk_size]
+                try:
+                    await conn.begin()
+                    ids = await _upsert_chunk(cursor, [rows[key] for key in chunk_keys])
+                    await conn.commit()
+                    record_write()
+                    if category_cache is not None:
+                        category_cache.clear()
+                except aiomysql.MySQLError as e:
+                    await conn.rollback()
+                    for key in chunk_keys:
+                        for index in positions[key]:
+                            results[index] = {"error": f"Database error: {e}"}
+                    continue
+
+                for key in chunk_keys:
+                    item_id = str(uuid.UUID(bytes=ids[key]))
+                    for index in positions[key]:
+                        results[index] = {"id": item_id}
+
+    return results
+
+
+async def _iter_lines(chunks, max_line_bytes: int):
+    """
+    Split a stream of byte chunks into lines, holding at most one partial line in memory.
+
+    Lines longer than max_line_bytes are yielded as None and their bytes discarded.
+    """
+    buffer = b""
+    discarding = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield None if discarding or len(line) > max_line_bytes else line
+            discarding = False
+        if len(buffer) > max_line_bytes:
+            buffer = b""
+            discarding = True
+    if buffer or discarding:
+        yield None if discarding or len(buffer) > max_line_bytes else buffer
+
+
+async def import_items(chunks, db_pool: aiomysql.Pool, batch_size: int = BULK_CHUNK_SIZE,
+                       category_cache: CategoryCache = None, admit=None) -> dict:
+    """
+    Import newline-delimited JSON items from an async iterable of byte chunks.
+
+    Records are parsed and validated as they arrive and written in batches of batch_size, each in
+    its own transaction on a connection acquired for that batch only. The next batch is not read
+    until the previous one is written, so a busy pool slows down consumption of the request body
+    instead of letting records pile up in memory. Like insert_items, every committed batch
+    clears category_cache.
+
+    admit, if given, returns an async context manager held around each batch's write only, so
+    nothing is held while the next batch is read from a slow client.
+    """
+    summary = {"records": 0, "written": 0, "failed": 0, "batches": 0, "errors": []}
+
+    def record_error(line_number, error):
+        summary["failed"] += 1
+        if len(summary["errors"]) < MAX_IMPORT_ERRORS_REPORTED:
+            summary["errors"].append({"line": line_number, "error": error})
+
+    async def write_batch(batch):
+        # Within a batch the last record for a name wins; write in lock order like insert_items
+        rows = {}
+        for line_number, row in batch:
+            rows[row[0].casefold()] = (line_number, row)
+        try:
+            async with _admit(admit), db_pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    try:
+                        await conn.begin()
+                        await _upsert_rows(cursor, sorted((row for _, row in rows.values()), key=_lock_order))
+                        await conn.commit()
+                        record_write()
+                        if category_cache is not None:
+                            category_cache.clear()
+                    except Exception:
+                        await conn.rollback()
+                        raise
+        except aiomysql.MySQLError as e:
+            for line_number, _ in batch:
+                record_error(line_number, f"Database error: {e}")
+        else:
+            summary["written"] += len(batch)
+        summary["batches"] += 1
+        logger.info(
+            "Import progress: %d records read, %d written, %d failed",
+            summary["records"], summary["written"], summary["failed"]
+        )
+
+    batch = []
+    line_number = 0
+    async for line in _iter_lines(chunks, MAX_IMPORT_LINE_BYTES):
+        line_number += 1
+        if line is not None and not line.strip():
+            continue  # Blank lines are allowed between records
+        summary["records"] += 1
+        if line is None:
+            record_error(line_number, f"Record exceeds {MAX_IMPORT_LINE_BYTES} bytes")
+            continue
+        try:
+            batch.append((line_number, _validate_item(json.loads(line))))
+        except ValueError as e:  # Includes json.JSONDecodeError
+            record_error(line_number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            await write_batch(batch)
+            batch = []
+
+    if batch:
+        await write_batch(batch)
+    return summary
+
+
+def encode_page_token(last_updated_dt: datetime, item_id: bytes) -> str:
+    """Opaque continuation token holding the sort key of the last row on a page."""
+    payload = json.dumps([last_updated_dt.isoformat(), item_id.hex()]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_page_token(page_token: str) -> tuple:
+    try:
+        payload = base64.urlsafe_b64decode(page_token + "=" * (-len(page_token) % 4))
+        last_updated_dt, item_id = json.loads(payload)
+        return datetime.fromisoformat(last_updated_dt), bytes.fromhex(item_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid page token")
+
+
+async def get_items_within_date_range(date_range: DateRangeInput, db_pool: aiomysql.Pool,
+                                      limit: int = None, page_token: str = None, totals_only: bool = False,
+                                      raw_rows: bool = False, admit=None):
+    """
+    Return the items within a date range with their total price, or only the totals.
+
+    With raw_rows, items are the tuple rows as read, in ITEM_ROW.columns order, for encoders
+    that do not need a dict per row.
+
+    Concurrent identical calls share one query through read_flights. The key includes this
+    process's write count, so a call made after a local write never joins a query started
+    before it. admit, if given, returns an async context manager held around the query by the
+    call that runs it; calls joining a running query do not enter it.
+    """
+    key = (
+        "items", id(db_pool), write_count(), date_range.dt_from, date_range.dt_to, limit, page_token, totals_only,
+        raw_rows
+    )
+
+    async def query():
+        async with _admit(admit):
+            return await _get_items_within_date_range(date_range, db_pool, limit, page_token, totals_only, raw_rows)
+
+    return await read_flights.do(key, query)
+
+
+async def _get_items_within_date_range(date_range: DateRangeInput, db_pool: aiomysql.Pool,
+                                       limit: int, page_token: str, totals_only: bool, raw_rows: bool):
+    # Without limit or page_token every matching item is returned, as before
+    paginated = limit is not None or page_token is not None
+    if paginated and limit is None:
+        limit = DEFAULT_PAGE_SIZE
+
     async with db_pool.acquire() as conn:
-        cursor = await conn.cursor(aiomysql.cursors.DictCursor)
+        cursor = await conn.cursor()
         async with cursor as cursor:
-            # Define the SQL query with parameters
-            sql = "SELECT id, name, category, price FROM items WHERE last_updated_dt BETWEEN %s AND %s"
+            if totals_only:
+                # Count and sum in MySQL without transferring any rows
+                await statements.ITEMS_TOTALS_BY_DATE_RANGE.execute(cursor, (date_range.dt_from, date_range.dt_to))
+                count, total_price = await statements.ITEMS_TOTALS_BY_DATE_RANGE.fetchone(cursor)
+                return {"count": count, "total_price": total_price}
 
-            # Execute the query with parameters
-            await cursor.execute(sql, (date_range.dt_from, date_range.dt_to))
-            items = await cursor.fetchall()
+            # Pick the SQL statement and its parameters
+            params = [date_range.dt_from, date_range.dt_to]
+            if not paginated:
+                statement = statements.ITEMS_BY_DATE_RANGE
+            elif page_token is None:
+                statement = statements.ITEMS_PAGE_BY_DATE_RANGE
+            else:
+                # Keyset pagination: seek past the last (last_updated_dt, id) already returned
+                # through the index instead of counting rows with OFFSET
+                last_updated_dt, last_id = decode_page_token(page_token)
+                statement = statements.ITEMS_PAGE_BY_DATE_RANGE_AFTER
+                params += [last_updated_dt, last_updated_dt, last_id]
+            if paginated:
+                # One extra row tells whether another page follows
+                params.append(limit + 1)
 
-            if not items:
+            # Execute the query with parameters; rows come back as plain tuples
+            await statement.execute(cursor, params)
+            rows = await statement.fetchall(cursor)
+
+            if not rows:
                 return {"message": "No items found within the specified date range"}
 
-            # Decode byte strings and convert bytes to UUID where necessary
-            for item in items:
-                for key, value in item.items():
-                    if isinstance(value, bytes):
-                        try:
-                            # Attempt to decode byte string to UUID
-                            item[key] = uuid.UUID(bytes=value)
-                        except ValueError:
-                            # Handle the exception by assigning a default or error message
-                            item[key] = "Invalid encoding"
-
-            # Calculate the total price of all items
-            total_price = sum(float(item['price']) for item in items)
-
-            return {"items": items, "total_price": total_price}
+            next_page_token = None
+            if paginated and len(rows) > limit:
+                rows = rows[:limit]
+                last_row = rows[-1]
+                next_page_token = encode_page_token(last_row[4], uuid.UUID(last_row[0]).bytes)
+
+            # Ids already arrive as UUID strings, so rows only need pairing with column names
+            result = {"items": rows if raw_rows else ITEM_ROW.decode_rows(rows)}
+            if paginated:
+                # No page carries the total of the range, which would cost a scan of the whole
+                # range and could disagree with the rows; clients ask for totals_only instead
+                result["next_page_token"] = next_page_token
+            else:
+                # Every row of the range is here, so the total is exact and matches them
+                result["total_price"] = sum((row[3] for row in rows), Decimal(0))
+            return result
+
+
+async def iter_items_within_date_range(date_range: DateRangeInput, db_pool: aiomysql.Pool,
+                                       batch_size: int = STREAM_BATCH_SIZE, raw_rows: bool = False):
+    """
+    Yield the items within a date range in batches, as they are read from the server. With
+    raw_rows the batches hold tuple rows in ITEM_ROW.columns order instead of dicts.
+
+    An unbuffered server-side cursor is used, so only one batch is held in memory at a time and
+    the first batch is available as soon as MySQL produces it. The connection stays checked out
+    until the generator is exhausted or closed.
+    """
+    async with db_pool.acquire() as conn:
+        cursor = await conn.cursor(aiomysql.cursors.SSCursor)
+        exhausted = False
+        try:
+            await statements.ITEMS_BY_DATE_RANGE.execute(cursor, (date_range.dt_from, date_range.dt_to))
+            while True:
+                rows = await statements.ITEMS_BY_DATE_RANGE.fetchmany(cursor, batch_size)
+                if not rows:
+                    exhausted = True
+                    break
+                yield rows if raw_rows else ITEM_ROW.decode_rows(rows)
+        finally:
+            if exhausted:
+                await cursor.close()
+            else:
+                # Closing an unbuffered cursor reads every remaining row; drop the connection
+                # instead so an abandoned stream does not drain the rest of the result set
+                conn.close()
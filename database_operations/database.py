@@ -1,4 +1,15 @@
+import asyncio
+import logging
+import os
+import time
 import aiomysql
+from fastapi import Depends, Request
+from .metrics import (
+    DB_POOL_ACQUIRE_SECONDS, DB_POOL_ACQUIRE_TIMEOUTS, DB_POOL_CONNECTIONS, DB_POOL_SIZE, DB_POOL_MAX_SIZE,
+    DB_POOL_WAITING, DB_POOL_CONNECTION_AGE_SECONDS, DB_POOL_CONNECTIONS_OPENED, DB_POOL_CONNECTIONS_CLOSED
+)
+
+logger = logging.getLogger(__name__)
 
 # Database configuration
 DATABASE_CONFIG = {
@@ -9,12 +20,195 @@ DATABASE_CONFIG = {
     "db": "inventory",
 }
 
-async def create_db_pool():
-    print("DEBUG: Creating database pool")
-    pool = await aiomysql.create_pool(**DATABASE_CONFIG)
-    return pool
+# Pool names. OLTP serves inserts and point reads; REPORTING serves range scans and aggregates,
+# so a long report can never hold the connections inserts need.
+OLTP = "oltp"
+REPORTING = "reporting"
+
+# OLTP connection pool configuration, overridable through the environment
+POOL_CONFIG = {
+    "minsize": int(os.getenv("DB_POOL_MINSIZE", "1")),
+    "maxsize": int(os.getenv("DB_POOL_MAXSIZE", "10")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "3600")),  # Seconds, -1 disables recycling
+}
+
+# Seconds to wait for a free connection before giving up
+ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10"))
+
+# Reporting connection pool configuration; a maxsize of 0 sends reports to the OLTP pool
+REPORTING_POOL_CONFIG = {
+    "minsize": int(os.getenv("DB_REPORTING_POOL_MINSIZE", "1")),
+    "maxsize": int(os.getenv("DB_REPORTING_POOL_MAXSIZE", "4")),
+    "pool_recycle": int(os.getenv("DB_REPORTING_POOL_RECYCLE", "3600")),
+}
+
+# Reports may queue for longer than inserts before giving up
+REPORTING_ACQUIRE_TIMEOUT = float(os.getenv("DB_REPORTING_POOL_ACQUIRE_TIMEOUT", "30"))
+
+# Milliseconds a SELECT on a reporting connection may run before MySQL aborts it; 0 for no limit
+REPORTING_MAX_EXECUTION_TIME = int(os.getenv("DB_REPORTING_MAX_EXECUTION_TIME", "0"))
+
+
+class PoolAcquireTimeout(asyncio.TimeoutError):
+    """No pooled connection became free within the acquire timeout."""
+
+    def __init__(self, pool: str, timeout: float):
+        super().__init__(f"No connection in pool {pool!r} became free within {timeout}s")
+        self.pool = pool
+        self.timeout = timeout
+
+
+class _AcquireContextManager:
+    """Lets ``pool.acquire()`` be awaited or used with ``async with``, like aiomysql's own."""
+
+    def __init__(self, coro, pool):
+        self._coro = coro
+        self._pool = pool
+        self._conn = None
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self):
+        self._conn = await self._coro
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            await self._pool.release(self._conn)
+        finally:
+            self._conn = None
+
+
+class DatabasePool:
+    """
+    Application-lifetime wrapper around an aiomysql pool.
+
+    Exposes the same acquire/release interface as aiomysql.Pool, but bounds how long
+    acquire() waits for a free connection, raising PoolAcquireTimeout once it has waited
+    acquire_timeout seconds.
+
+    Acquire waits, timeouts and the age of checked out connections are recorded under the
+    pool's name, and the in-use, idle and total connection counts are read when metrics are
+    collected. aiomysql opens and closes connections without telling anyone, so connections are
+    counted as opened when first checked out and as closed (recycled if they had outlived
+    recycle seconds) once seen closed.
+    """
 
+    def __init__(self, pool: aiomysql.Pool, acquire_timeout: float = ACQUIRE_TIMEOUT, name: str = OLTP,
+                 recycle: int = POOL_CONFIG["pool_recycle"], clock=time.monotonic):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.name = name
+        self.recycle = recycle
+        self._clock = clock
+        self._waiting = 0
+        # Connection -> when it was first checked out
+        self._opened_at = {}
+        DB_POOL_CONNECTIONS.set_function(lambda: self.size - self.freesize, name, "in_use")
+        DB_POOL_CONNECTIONS.set_function(lambda: self.freesize, name, "idle")
+        DB_POOL_SIZE.set_function(lambda: self.size, name)
+        DB_POOL_MAX_SIZE.set_function(lambda: self.maxsize, name)
+        DB_POOL_WAITING.set_function(lambda: self._waiting, name)
 
-async def close_db_pool(pool: aiomysql.Pool):
+    def acquire(self):
+        return _AcquireContextManager(self._acquire(), self)
+
+    async def _acquire(self):
+        started = self._clock()
+        self._waiting += 1
+        try:
+            conn = await asyncio.wait_for(self._pool.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            DB_POOL_ACQUIRE_TIMEOUTS.inc(self.name)
+            raise PoolAcquireTimeout(self.name, self.acquire_timeout) from None
+        finally:
+            self._waiting -= 1
+        now = self._clock()
+        DB_POOL_ACQUIRE_SECONDS.observe(now - started, self.name)
+        self._track(conn, now)
+        return conn
+
+    def _track(self, conn, now: float):
+        # At most maxsize connections are tracked, so scanning them on every checkout is cheap
+        for known, opened_at in list(self._opened_at.items()):
+            if known.closed:
+                del self._opened_at[known]
+                recycled = -1 < self.recycle <= now - opened_at
+                DB_POOL_CONNECTIONS_CLOSED.inc(self.name, "recycled" if recycled else "closed")
+        opened_at = self._opened_at.get(conn)
+        if opened_at is None:
+            opened_at = self._opened_at[conn] = now
+            DB_POOL_CONNECTIONS_OPENED.inc(self.name)
+        DB_POOL_CONNECTION_AGE_SECONDS.observe(now - opened_at, self.name)
+
+    async def release(self, conn):
+        await self._pool.release(conn)
+
+    @property
+    def size(self):
+        return self._pool.size
+
+    @property
+    def freesize(self):
+        return self._pool.freesize
+
+    @property
+    def maxsize(self):
+        return self._pool.maxsize
+
+    def close(self):
+        self._pool.close()
+
+    async def wait_closed(self):
+        await self._pool.wait_closed()
+
+
+async def create_db_pool(pool_config: dict = None, acquire_timeout: float = ACQUIRE_TIMEOUT, name: str = OLTP,
+                         max_execution_time: int = 0):
+    pool_config = pool_config or POOL_CONFIG
+    logger.info(
+        "Creating database pool %s (minsize=%d, maxsize=%d)", name, pool_config["minsize"], pool_config["maxsize"]
+    )
+    # Reads then leave no transaction open, which would make aiomysql close their connection on
+    # release instead of reusing it; writes open theirs explicitly with begin()
+    options = {"autocommit": True}
+    if max_execution_time > 0:
+        options["init_command"] = f"SET SESSION max_execution_time = {int(max_execution_time)}"
+    pool = await aiomysql.create_pool(**DATABASE_CONFIG, **pool_config, **options)
+    return DatabasePool(pool, acquire_timeout, name=name, recycle=pool_config["pool_recycle"])
+
+
+async def create_reporting_pool():
+    """The reporting pool, or None when it is disabled and reports share the OLTP pool."""
+    if REPORTING_POOL_CONFIG["maxsize"] <= 0:
+        return None
+    return await create_db_pool(
+        REPORTING_POOL_CONFIG, REPORTING_ACQUIRE_TIMEOUT, name=REPORTING, max_execution_time=REPORTING_MAX_EXECUTION_TIME
+    )
+
+
+async def close_db_pool(pool: DatabasePool):
     pool.close()
-    await pool.wait_closed()
\ No newline at end of file
+    await pool.wait_closed()
+
+
+_pool_lock = asyncio.Lock()
+
+
+async def get_db_pool(request: Request) -> DatabasePool:
+    """FastAPI dependency returning the pool created at application startup."""
+    pool = getattr(request.app.state, "db_pool", None)
+    if pool is None:
+        # The lifespan did not run (e.g. a bare ASGI test client), so create it on first use
+        async with _pool_lock:
+            pool = getattr(request.app.state, "db_pool", None)
+            if pool is None:
+                pool = request.app.state.db_pool = await create_db_pool()
+    return pool
+
+
+async def get_reporting_pool(request: Request, db_pool: DatabasePool = Depends(get_db_pool)) -> DatabasePool:
+    """FastAPI dependency returning the pool for range scans and aggregates."""
+    # Without a reporting pool, reports share the OLTP pool (or whatever replaces it in tests)
+    return getattr(request.app.state, "reporting_pool", None) or db_pool
@@ -0,0 +1,22 @@
+class RowDecoder:
+    """
+    Turns tuple rows of a known column layout into dicts.
+
+    Values are passed through as the MySQL driver returned them, so no per-value type checks
+    are needed; any conversion belongs in the SQL, like BIN_TO_UUID for ids.
+    """
+
+    def __init__(self, columns: tuple):
+        self.columns = tuple(columns)
+
+    def decode(self, row: tuple) -> dict:
+        return dict(zip(self.columns, row))
+
+    def decode_rows(self, rows) -> list:
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in rows]
+
+
+# Rows of the items listing statements. MySQL formats the binary(16) id with BIN_TO_UUID, which
+# is far cheaper than building uuid.UUID objects row by row, so no column needs converting.
+ITEM_ROW = RowDecoder(("id", "name", "category", "price", "last_updated_dt"))
@@ -0,0 +1,146 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Everything runs on the event loop thread, so observations are plain integer and float updates
+with no locks. Bucket counts are stored per bucket and only made cumulative when rendered.
+"""
+from bisect import bisect_left
+
+# Seconds; from sub-millisecond index lookups to multi-second exports
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), registry: list = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        if registry is not None:
+            registry.append(self)
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, *labelvalues):
+        self._values[labelvalues] = value
+
+    def set_function(self, function, *labelvalues):
+        """Read the value from function() whenever the gauge is collected."""
+        self._values[labelvalues] = function
+
+    def value(self, *labelvalues) -> float:
+        value = self._values.get(labelvalues, 0)
+        return value() if callable(value) else value
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labelvalues in sorted(self._values):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {self.value(*labelvalues)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS,
+                 registry: list = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [count per bucket (the last one is +Inf), sum]
+        self._series = {}
+        if registry is not None:
+            registry.append(self)
+
+    def observe(self, value: float, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labelvalues) -> int:
+        series = self._series.get(labelvalues)
+        return sum(series[0]) if series else 0
+
+    def collect(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.labelnames, labelvalues, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return lines
+
+
+def render(registry: list = REGISTRY) -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+STATEMENT_EXECUTE_SECONDS = Histogram(
+    "db_statement_execute_seconds", "Time spent executing a SQL statement.", ("statement",)
+)
+STATEMENT_FETCH_SECONDS = Histogram(
+    "db_statement_fetch_seconds", "Time spent fetching the rows of a SQL statement.", ("statement",)
+)
+STATEMENT_ROWS = Counter(
+    "db_statement_rows_total", "Rows returned by a SQL statement.", ("statement",)
+)
+STATEMENT_BYTES = Counter(
+    "db_statement_fetched_bytes_total", "Estimated size of the rows returned by a SQL statement.", ("statement",)
+)
+
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "db_pool_acquire_wait_seconds", "Time spent waiting for a pooled connection.", ("pool",)
+)
+DB_POOL_ACQUIRE_TIMEOUTS = Counter(
+    "db_pool_acquire_timeouts_total", "Acquires that gave up waiting for a connection.", ("pool",)
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Open pooled connections by state (in_use, idle).", ("pool", "state")
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Open pooled connections.", ("pool",))
+DB_POOL_MAX_SIZE = Gauge("db_pool_max_size", "Upper bound on pooled connections.", ("pool",))
+DB_POOL_WAITING = Gauge("db_pool_acquire_waiting", "Callers waiting for a pooled connection.", ("pool",))
+DB_POOL_CONNECTION_AGE_SECONDS = Histogram(
+    "db_pool_connection_age_seconds", "Age of connections when checked out.", ("pool",),
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 7200, 14400)
+)
+DB_POOL_CONNECTIONS_OPENED = Counter(
+    "db_pool_connections_opened_total", "Connections opened by the pool.", ("pool",)
+)
+DB_POOL_CONNECTIONS_CLOSED = Counter(
+    "db_pool_connections_closed_total",
+    "Connections closed, by reason: recycled after pool_recycle or closed for any other cause.", ("pool", "reason")
+)
@@ -0,0 +1,165 @@
+"""
+Versioned schema migrations for the inventory database.
+
+Applied versions are recorded in the schema_migrations table. Every step checks the current
+schema before changing it, so databases created from init.sql (which already has the latest
+schema) are simply marked as up to date.
+
+    python -m database_operations.migrations status
+    python -m database_operations.migrations upgrade
+    python -m database_operations.migrations check-plans
+
+check-plans runs EXPLAIN for every registered read statement and exits non-zero if one would
+scan the items table without an index. Run it against a database with representative data,
+since on a near-empty table MySQL may prefer a full scan anyway.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import aiomysql
+from .category_summary import INITIAL_TRIGGERS, TRIGGERS, create_category_summary, replace_changed_triggers
+from .database import DATABASE_CONFIG
+from .price_migration import migrate_price_column
+from .statements import STATEMENTS
+from .watermark import create_change_count
+
+logger = logging.getLogger(__name__)
+
+
+async def _index_exists(cursor, table: str, index: str) -> bool:
+    await cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1",
+        (table, index)
+    )
+    return await cursor.fetchone() is not None
+
+
+def add_index(table: str, index: str, definition: str):
+    """Migration step creating an index online unless it already exists."""
+
+    async def step(conn, cursor):
+        if await _index_exists(cursor, table, index):
+            logger.info("Index %s.%s already exists", table, index)
+            return
+        logger.info("Creating index %s.%s", table, index)
+        await cursor.execute(f"ALTER TABLE {table} ADD {definition}, ALGORITHM=INPLACE, LOCK=NONE")
+
+    return step
+
+
+async def _check_unique_names(conn, cursor):
+    # A unique index cannot be built over duplicates, and merging them is a business decision
+    await cursor.execute("SELECT name FROM items GROUP BY name HAVING COUNT(*) > 1 LIMIT 10")
+    duplicates = [name for (name,) in await cursor.fetchall()]
+    if duplicates:
+        raise RuntimeError(f"Merge items with duplicate names before adding the unique index: {duplicates}")
+
+
+async def _convert_price(conn, cursor):
+    await migrate_price_column(conn)
+
+
+# (version, description, steps); append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, "Unique index on items.name", [
+        _check_unique_names,
+        add_index("items", "uq_items_name", "UNIQUE KEY uq_items_name (name)"),
+    ]),
+    (2, "Store items.price as DECIMAL(12,2)", [_convert_price]),
+    (3, "Index on items.last_updated_dt", [
+        add_index("items", "idx_items_last_updated_dt", "KEY idx_items_last_updated_dt (last_updated_dt)"),
+    ]),
+    (4, "Covering index on items.category and price", [
+        add_index("items", "idx_items_category_price", "KEY idx_items_category_price (category, price)"),
+    ]),
+    (5, "Trigger-maintained item_category_summary table", [create_category_summary(INITIAL_TRIGGERS)]),
+    (6, "Record the previous category of updated items", [replace_changed_triggers(TRIGGERS)]),
+    (7, "Trigger-maintained items_change_count table for ETags", [create_change_count]),
+]
+
+
+async def _ensure_migrations_table(cursor):
+    await cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INT NOT NULL PRIMARY KEY, "
+        "description VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+
+async def applied_versions(conn) -> set:
+    async with conn.cursor() as cursor:
+        await _ensure_migrations_table(cursor)
+        await cursor.execute("SELECT version FROM schema_migrations")
+        return {version for (version,) in await cursor.fetchall()}
+
+
+async def apply_migrations(conn, migrations: list = MIGRATIONS) -> list:
+    """Apply pending migrations in version order and return the versions applied."""
+    done = await applied_versions(conn)
+    applied = []
+    async with conn.cursor() as cursor:
+        for version, description, steps in sorted(migrations, key=lambda migration: migration[0]):
+            if version in done:
+                continue
+            logger.info("Applying migration %d: %s", version, description)
+            for step in steps:
+                await step(conn, cursor)
+            await cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description)
+            )
+            await conn.commit()
+            applied.append(version)
+    return applied
+
+
+async def check_query_plans(conn, statements: dict = STATEMENTS) -> list:
+    """
+    EXPLAIN every statement that declares sample parameters and return a description of each
+    one that reads the items table without using an index.
+    """
+    problems = []
+    async with conn.cursor(aiomysql.cursors.DictCursor) as cursor:
+        for statement in statements.values():
+            if statement.explain_params is None:
+                continue
+            await cursor.execute("EXPLAIN " + statement.explain_sql, statement.explain_params)
+            for row in await cursor.fetchall():
+                if row.get("table") == "items" and row.get("key") is None:
+                    problems.append(
+                        f"{statement.name}: full scan of items (type={row.get('type')}, "
+                        f"possible_keys={row.get('possible_keys')})"
+                    )
+    return problems
+
+
+async def main(command: str) -> int:
+    conn = await aiomysql.connect(**DATABASE_CONFIG)
+    try:
+        if command == "status":
+            done = await applied_versions(conn)
+            for version, description, _ in MIGRATIONS:
+                print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {description}")
+        elif command == "upgrade":
+            applied = await apply_migrations(conn)
+            print(f"Applied migrations: {applied}" if applied else "Database is up to date")
+        elif command == "check-plans":
+            problems = await check_query_plans(conn)
+            for problem in problems:
+                print(problem)
+            if problems:
+                return 1
+            print("All statements use an index")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "upgrade", "check-plans"])
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.command)))
@@ -1,9 +1,28 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Optional
 
 class ItemResponse(BaseModel):
     id: str
 
+class BulkItemResult(BaseModel):
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkItemResponse(BaseModel):
+    items: List[BulkItemResult]
+
+class ImportRecordError(BaseModel):
+    line: int
+    error: str
+
+class ImportSummary(BaseModel):
+    records: int
+    written: int
+    failed: int
+    batches: int
+    errors: List[ImportRecordError]
+
 class DateRangeInput(BaseModel):
     dt_from: datetime
     dt_to: datetime
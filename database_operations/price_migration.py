@@ -0,0 +1,141 @@
+"""
+Online conversion of items.price from varchar(10) to DECIMAL(12,2).
+
+The table stays writable throughout:
+
+1. A nullable ``price_numeric`` DECIMAL column is added and ``price`` is made nullable.
+2. Triggers copy every new or updated price into ``price_numeric``.
+3. Existing rows are backfilled in primary-key order, one short transaction per chunk.
+4. Under a brief table lock the triggers are dropped and the columns are renamed, which is a
+   metadata-only change.
+5. The old column is dropped and the new one made NOT NULL with an in-place rebuild.
+
+Every step checks the current schema first, so an interrupted run can simply be restarted:
+
+    python -m database_operations.price_migration --chunk-size 1000 --pause 0.05
+"""
+import argparse
+import asyncio
+import logging
+import aiomysql
+from .database import DATABASE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+TRIGGERS = {
+    "items_price_numeric_insert": "BEFORE INSERT",
+    "items_price_numeric_update": "BEFORE UPDATE",
+}
+
+
+async def _column_type(cursor, column: str):
+    await cursor.execute(
+        "SELECT DATA_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'items' AND COLUMN_NAME = %s",
+        (column,)
+    )
+    row = await cursor.fetchone()
+    return row[0].lower() if row else None
+
+
+async def _trigger_exists(cursor, name: str) -> bool:
+    await cursor.execute(
+        "SELECT 1 FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s",
+        (name,)
+    )
+    return await cursor.fetchone() is not None
+
+
+async def _backfill(conn, cursor, chunk_size: int, pause: float) -> int:
+    converted = 0
+    last_id = b""
+    while True:
+        await cursor.execute("SELECT id FROM items WHERE id > %s ORDER BY id LIMIT %s", (last_id, chunk_size))
+        ids = await cursor.fetchall()
+        if not ids:
+            return converted
+
+        upper_id = ids[-1][0]
+        # Keep last_updated_dt as is; otherwise ON UPDATE CURRENT_TIMESTAMP would touch every row
+        await cursor.execute(
+            "UPDATE items SET price_numeric = CAST(price AS DECIMAL(12,2)), last_updated_dt = last_updated_dt "
+            "WHERE id > %s AND id <= %s AND price_numeric IS NULL",
+            (last_id, upper_id)
+        )
+        await conn.commit()
+
+        converted += cursor.rowcount
+        last_id = upper_id
+        logger.info("Backfilled %d rows", converted)
+        if pause:
+            await asyncio.sleep(pause)
+
+
+async def migrate_price_column(conn, chunk_size: int = 1000, pause: float = 0.0):
+    async with conn.cursor() as cursor:
+        price_type = await _column_type(cursor, "price")
+        legacy_type = await _column_type(cursor, "price_legacy")
+        if price_type == "decimal" and legacy_type is None:
+            logger.info("items.price is already DECIMAL, nothing to do")
+            return
+
+        if legacy_type is None:
+            # Steps 1-4 have not completed yet
+            if await _column_type(cursor, "price_numeric") is None:
+                logger.info("Adding items.price_numeric")
+                await cursor.execute(
+                    "ALTER TABLE items ADD COLUMN price_numeric DECIMAL(12,2) NULL, "
+                    "MODIFY COLUMN price varchar(10) NULL"
+                )
+
+            for name, timing in TRIGGERS.items():
+                if not await _trigger_exists(cursor, name):
+                    logger.info("Creating trigger %s", name)
+                    await cursor.execute(
+                        f"CREATE TRIGGER {name} {timing} ON items FOR EACH ROW "
+                        "SET NEW.price_numeric = CAST(NEW.price AS DECIMAL(12,2))"
+                    )
+
+            converted = await _backfill(conn, cursor, chunk_size, pause)
+            logger.info("Backfill complete, %d rows converted", converted)
+
+            await cursor.execute("SELECT COUNT(*) FROM items WHERE price_numeric IS NULL AND price IS NOT NULL")
+            (missing,) = await cursor.fetchone()
+            if missing:
+                raise RuntimeError(f"{missing} rows still have no price_numeric value")
+
+            # Swap the columns while writes are briefly held off
+            logger.info("Swapping price columns")
+            await cursor.execute("LOCK TABLES items WRITE")
+            try:
+                for name in TRIGGERS:
+                    await cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                await cursor.execute(
+                    "ALTER TABLE items RENAME COLUMN price TO price_legacy, RENAME COLUMN price_numeric TO price"
+                )
+            finally:
+                await cursor.execute("UNLOCK TABLES")
+
+        logger.info("Dropping items.price_legacy")
+        await cursor.execute(
+            "ALTER TABLE items DROP COLUMN price_legacy, MODIFY COLUMN price DECIMAL(12,2) NOT NULL, "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+        logger.info("items.price is now DECIMAL(12,2)")
+
+
+async def main(chunk_size: int, pause: float):
+    conn = await aiomysql.connect(**DATABASE_CONFIG)
+    try:
+        await migrate_price_column(conn, chunk_size, pause)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows converted per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between chunks")
+    args = parser.parse_args()
+    asyncio.run(main(args.chunk_size, args.pause))
@@ -0,0 +1,41 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Share one execution between concurrent identical calls.
+
+    The first do() for a key starts the call; every do() for that key made before it finishes
+    awaits the same task and gets the same result, or the same exception. The result object is
+    shared, so callers must not modify it. A caller that is cancelled stops waiting without
+    cancelling the call for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.metrics = {
+            "executions": 0,
+            "shared": 0,
+        }
+
+    async def do(self, key, call):
+        """Await call() for key, or join the call for key already in flight."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.metrics["executions"] += 1
+        else:
+            self.metrics["shared"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {**self.metrics, "in_flight": len(self._calls)}
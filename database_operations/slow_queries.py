@@ -0,0 +1,96 @@
+import os
+import time
+from collections import deque
+import aiomysql
+
+SLOW_QUERY_CONFIG = {
+    # Executions taking at least this many seconds are captured; 0 disables capture
+    "threshold": float(os.getenv("SLOW_QUERY_THRESHOLD", "0.5")),
+    # Only the newest captures are kept
+    "capacity": int(os.getenv("SLOW_QUERY_LOG_SIZE", "100")),
+    # Parameters kept per capture; bulk statements with more are truncated and not explained
+    "max_params": int(os.getenv("SLOW_QUERY_MAX_PARAMS", "64")),
+}
+
+
+def _display(value):
+    # Binary ids as hex so the log can be rendered as JSON
+    return value.hex() if isinstance(value, (bytes, bytearray)) else value
+
+
+class SlowQuery:
+    def __init__(self, statement: str, sql: str, params, seconds: float, max_params: int):
+        self.statement = statement
+        self.sql = sql
+        self.seconds = seconds
+        self.captured_at = time.time()
+        params = tuple(params) if params is not None else ()
+        self.param_count = len(params)
+        self.truncated = len(params) > max_params
+        self.params = params[:max_params]
+        # Filled in by SlowQueryLog.explain_pending
+        self.plan = None
+        self.explain_error = None
+
+    @property
+    def explainable(self) -> bool:
+        return not self.truncated and self.plan is None and self.explain_error is None
+
+    def as_dict(self) -> dict:
+        return {
+            "statement": self.statement,
+            "seconds": round(self.seconds, 6),
+            "captured_at": self.captured_at,
+            "sql": self.sql,
+            "params": [_display(value) for value in self.params],
+            "param_count": self.param_count,
+            "truncated": self.truncated,
+            "plan": self.plan,
+            "explain_error": self.explain_error,
+        }
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of statement executions slower than threshold.
+
+    Capturing only records the SQL and parameters, so a slow database is not given more work on
+    the request path. The EXPLAIN plan of each capture is taken once, on a pooled connection,
+    the first time the log is inspected.
+    """
+
+    def __init__(self, threshold: float = SLOW_QUERY_CONFIG["threshold"],
+                 capacity: int = SLOW_QUERY_CONFIG["capacity"], max_params: int = SLOW_QUERY_CONFIG["max_params"]):
+        self.threshold = threshold
+        self.max_params = max_params
+        self._entries = deque(maxlen=capacity)
+        self.captured = 0
+
+    def record(self, statement: str, sql: str, params, seconds: float):
+        if self.threshold <= 0 or seconds < self.threshold:
+            return
+        self._entries.append(SlowQuery(statement, sql, params, seconds, self.max_params))
+        self.captured += 1
+
+    async def explain_pending(self, db_pool):
+        pending = [entry for entry in self._entries if entry.explainable]
+        if not pending:
+            return
+        async with db_pool.acquire() as conn:
+            async with conn.cursor(aiomysql.cursors.DictCursor) as cursor:
+                for entry in pending:
+                    try:
+                        await cursor.execute("EXPLAIN " + entry.sql, entry.params or None)
+                        entry.plan = list(await cursor.fetchall())
+                    except aiomysql.MySQLError as e:
+                        entry.explain_error = str(e)
+
+    def entries(self) -> list:
+        """Captures, newest first."""
+        return [entry.as_dict() for entry in reversed(self._entries)]
+
+    def clear(self):
+        self._entries.clear()
+
+
+slow_queries = SlowQueryLog()
@@ -0,0 +1,188 @@
+from datetime import datetime
+from time import perf_counter
+from .metrics import STATEMENT_EXECUTE_SECONDS, STATEMENT_FETCH_SECONDS, STATEMENT_ROWS, STATEMENT_BYTES
+from .slow_queries import slow_queries
+
+# Every SQL statement the application runs, by name
+STATEMENTS = {}
+
+# Sample parameters used when checking query plans; a narrow range so the optimizer's
+# choice reflects a selective request
+_SAMPLE_DT_FROM = datetime(2000, 1, 1)
+_SAMPLE_DT_TO = datetime(2000, 1, 2)
+
+# Rows sized per fetch when estimating the bytes fetched
+_SIZE_SAMPLE_ROWS = 16
+
+
+def _estimate_bytes(rows) -> int:
+    """
+    Approximate size of fetched tuple or dict rows: string and binary values by length, anything
+    else as 8 bytes. Sizing every value of a large listing costs about a third of encoding it,
+    so an evenly spaced sample of rows is sized and scaled up.
+    """
+    if not rows:
+        return 0
+    step = max(1, len(rows) // _SIZE_SAMPLE_ROWS)
+    sample = rows[::step]
+    size = 0
+    for row in sample:
+        for value in (row.values() if isinstance(row, dict) else row):
+            size += len(value) if isinstance(value, (str, bytes)) else 0 if value is None else 8
+    return size * len(rows) // len(sample)
+
+
+class Statement:
+    """
+    A named SQL statement.
+
+    Statements with explain_params are read paths whose EXPLAIN plan must use an index; see
+    database_operations.migrations.check_query_plans. SQL containing {placeholders} is completed
+    with format() at the call site and with explain_format when checked.
+
+    Running a statement through execute() and the fetch methods records their durations, the
+    rows returned and an estimate of the bytes fetched under the statement's name. Executions
+    slower than the slow query threshold are captured with their parameters; see
+    database_operations.slow_queries.
+    """
+
+    def __init__(self, name: str, sql: str, explain_params: tuple = None, explain_format: dict = None):
+        self.name = name
+        self.sql = sql
+        self.explain_params = explain_params
+        self.explain_format = explain_format
+
+    def format(self, **kwargs) -> str:
+        return self.sql.format(**kwargs)
+
+    @property
+    def explain_sql(self) -> str:
+        return self.format(**self.explain_format) if self.explain_format else self.sql
+
+    async def execute(self, cursor, params=None, sql: str = None):
+        """Execute the statement, or its formatted sql, on cursor."""
+        sql = sql or self.sql
+        started = perf_counter()
+        try:
+            return await cursor.execute(sql, params)
+        finally:
+            elapsed = perf_counter() - started
+            STATEMENT_EXECUTE_SECONDS.observe(elapsed, self.name)
+            # Buffered cursors read the whole result inside execute(), so this covers the query
+            slow_queries.record(self.name, sql, params, elapsed)
+
+    def _record_rows(self, rows):
+        STATEMENT_ROWS.inc(self.name, amount=len(rows))
+        STATEMENT_BYTES.inc(self.name, amount=_estimate_bytes(rows))
+
+    async def fetchone(self, cursor):
+        started = perf_counter()
+        try:
+            row = await cursor.fetchone()
+        finally:
+            STATEMENT_FETCH_SECONDS.observe(perf_counter() - started, self.name)
+        self._record_rows((row,) if row is not None else ())
+        return row
+
+    async def fetchall(self, cursor):
+        started = perf_counter()
+        try:
+            rows = await cursor.fetchall()
+        finally:
+            STATEMENT_FETCH_SECONDS.observe(perf_counter() - started, self.name)
+        self._record_rows(rows)
+        return rows
+
+    async def fetchmany(self, cursor, size: int):
+        started = perf_counter()
+        try:
+            rows = await cursor.fetchmany(size)
+        finally:
+            STATEMENT_FETCH_SECONDS.observe(perf_counter() - started, self.name)
+        self._record_rows(rows)
+        return rows
+
+    def __repr__(self):
+        return f"Statement({self.name!r})"
+
+
+def register(name: str, sql: str, explain_params: tuple = None, explain_format: dict = None) -> Statement:
+    if name in STATEMENTS:
+        raise ValueError(f"Statement {name!r} is already registered")
+    statement = STATEMENTS[name] = Statement(name, sql, explain_params, explain_format)
+    return statement
+
+
+ITEMS_UPSERT = register(
+    "items.upsert",
+    "INSERT INTO items (id, name, category, price) VALUES {values} AS new "
+    "ON DUPLICATE KEY UPDATE category = new.category, price = new.price"
+)
+
+ITEM_ID_BY_NAME = register(
+    "items.id_by_name",
+    "SELECT id FROM items WHERE name = %s",
+    explain_params=("",)
+)
+
+# @items_prev_category is set by the items update trigger; only meaningful right after an update
+ITEM_ID_AND_PREVIOUS_CATEGORY_BY_NAME = register(
+    "items.id_and_previous_category_by_name",
+    "SELECT id, @items_prev_category FROM items WHERE name = %s",
+    explain_params=("",)
+)
+
+ITEM_IDS_BY_NAMES = register(
+    "items.ids_by_names",
+    "SELECT id, name FROM items WHERE name IN ({names})",
+    explain_params=("", ""),
+    explain_format={"names": "%s, %s"}
+)
+
+ITEMS_BY_DATE_RANGE = register(
+    "items.by_date_range",
+    "SELECT BIN_TO_UUID(id) AS id, name, category, price, last_updated_dt FROM items WHERE last_updated_dt BETWEEN %s AND %s",
+    explain_params=(_SAMPLE_DT_FROM, _SAMPLE_DT_TO)
+)
+
+ITEMS_PAGE_BY_DATE_RANGE = register(
+    "items.page_by_date_range",
+    "SELECT BIN_TO_UUID(id) AS id, name, category, price, last_updated_dt FROM items WHERE last_updated_dt BETWEEN %s AND %s "
+    "ORDER BY last_updated_dt, id LIMIT %s",
+    explain_params=(_SAMPLE_DT_FROM, _SAMPLE_DT_TO, 100)
+)
+
+ITEMS_PAGE_BY_DATE_RANGE_AFTER = register(
+    "items.page_by_date_range_after",
+    "SELECT BIN_TO_UUID(id) AS id, name, category, price, last_updated_dt FROM items WHERE last_updated_dt BETWEEN %s AND %s "
+    "AND (last_updated_dt > %s OR (last_updated_dt = %s AND id > %s)) "
+    "ORDER BY last_updated_dt, id LIMIT %s",
+    explain_params=(_SAMPLE_DT_FROM, _SAMPLE_DT_TO, _SAMPLE_DT_FROM, _SAMPLE_DT_FROM, b"\x00" * 16, 100)
+)
+
+ITEMS_TOTALS_BY_DATE_RANGE = register(
+    "items.totals_by_date_range",
+    "SELECT COUNT(*) AS count, COALESCE(SUM(price), 0) AS total_price FROM items "
+    "WHERE last_updated_dt BETWEEN %s AND %s",
+    explain_params=(_SAMPLE_DT_FROM, _SAMPLE_DT_TO)
+)
+
+# Changes committed to items so far, counted by triggers per connection
+ITEMS_CHANGE_WATERMARK = register(
+    "items.change_watermark",
+    "SELECT COALESCE(SUM(changes), 0) FROM items_change_count",
+    explain_params=()
+)
+
+CATEGORY_TOTALS_ALL = register(
+    "category.totals_all",
+    "SELECT category, total_price, item_count AS count FROM item_category_summary WHERE item_count > 0",
+    explain_params=()
+)
+
+CATEGORY_TOTALS_ONE = register(
+    "category.totals_one",
+    "SELECT category, total_price, item_count AS count FROM item_category_summary "
+    "WHERE category = %s AND item_count > 0",
+    explain_params=("",)
+)
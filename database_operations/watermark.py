@@ -0,0 +1,142 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from . import statements
+
+logger = logging.getLogger(__name__)
+
+# How long a watermark read from MySQL is reused. Writes made by this process change the
+# watermark at once; max_age bounds how long writes made by other processes can go unnoticed.
+WATERMARK_CONFIG = {
+    "max_age": float(os.getenv("ETAG_WATERMARK_MAX_AGE", "1")),
+}
+
+# Writes committed by this process, bumped by every write path in crud and the coalescer
+_write_count = 0
+
+
+def record_write():
+    global _write_count
+    _write_count += 1
+
+
+def write_count() -> int:
+    return _write_count
+
+
+# One row per MySQL connection, bumped by triggers in the same transaction as every insert,
+# update and delete on items. The sum moves on every commit, whichever process made it and
+# whatever last_updated_dt its rows carry, and since each connection has its own row, writers
+# never wait on one another for it.
+CREATE_CHANGE_COUNT_SQL = (
+    "CREATE TABLE IF NOT EXISTS items_change_count ("
+    "connection_id bigint unsigned NOT NULL, "
+    "changes bigint unsigned NOT NULL, "
+    "PRIMARY KEY (connection_id)"
+    ") ENGINE=InnoDB"
+)
+
+_COUNT_CHANGE = (
+    "INSERT INTO items_change_count (connection_id, changes) VALUES (CONNECTION_ID(), 1) "
+    "ON DUPLICATE KEY UPDATE changes = changes + 1"
+)
+
+CHANGE_COUNT_TRIGGERS = {
+    "items_change_count_insert": ("AFTER INSERT", _COUNT_CHANGE),
+    "items_change_count_update": ("AFTER UPDATE", _COUNT_CHANGE),
+    "items_change_count_delete": ("AFTER DELETE", _COUNT_CHANGE),
+}
+
+
+async def create_change_count(conn, cursor):
+    """Migration step creating items_change_count and its triggers if missing."""
+    await cursor.execute(CREATE_CHANGE_COUNT_SQL)
+    for name, (timing, body) in CHANGE_COUNT_TRIGGERS.items():
+        await cursor.execute(
+            "SELECT 1 FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s",
+            (name,)
+        )
+        if await cursor.fetchone() is None:
+            logger.info("Creating trigger %s", name)
+            await cursor.execute(f"CREATE TRIGGER {name} {timing} ON items FOR EACH ROW {body}")
+
+
+async def fold_change_count(db_pool):
+    """
+    Move the counts of every connection into row 0, keeping their sum, so the table does not
+    grow by a row for every connection ever opened. Run once at startup.
+
+    Connections writing at the time only wait for this short transaction, then start a new row.
+    """
+    async with db_pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await conn.begin()
+            try:
+                await cursor.execute(
+                    "SELECT COALESCE(SUM(changes), 0), COUNT(*) FROM items_change_count "
+                    "WHERE connection_id <> 0 FOR UPDATE"
+                )
+                changes, rows = await cursor.fetchone()
+                if rows:
+                    await cursor.execute("DELETE FROM items_change_count WHERE connection_id <> 0")
+                    await cursor.execute(
+                        "INSERT INTO items_change_count (connection_id, changes) VALUES (0, %s) AS folded "
+                        "ON DUPLICATE KEY UPDATE changes = changes + folded.changes",
+                        (changes,)
+                    )
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+
+class ChangeWatermark:
+    """
+    Cheap token that changes whenever the items table does.
+
+    It combines the sum of items_change_count, which moves with every commit to items by any
+    process, with this process's write count, so local writes show up before the next refresh.
+
+    Reading the watermark is only worth it while it is cheap: if it cannot be read, for example
+    because the pool or the admission controller is saturated, current() returns None for the
+    next max_age seconds instead of making every read wait for another attempt.
+    """
+
+    def __init__(self, max_age: float = WATERMARK_CONFIG["max_age"], clock=time.monotonic):
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = asyncio.Lock()
+        self._fetched_at = None
+        self._changes = None
+
+    def _expired(self) -> bool:
+        return self._fetched_at is None or self._clock() - self._fetched_at >= self.max_age
+
+    async def _refresh(self, db_pool, admit):
+        try:
+            async with admit() if admit is not None else contextlib.nullcontext():
+                async with db_pool.acquire() as conn:
+                    async with conn.cursor() as cursor:
+                        await statements.ITEMS_CHANGE_WATERMARK.execute(cursor)
+                        (self._changes,) = await statements.ITEMS_CHANGE_WATERMARK.fetchone(cursor)
+        except Exception as e:
+            # Requests go without an ETag until the next attempt
+            logger.warning("Could not read the change watermark: %s", e)
+            self._changes = None
+        self._fetched_at = self._clock()
+
+    async def current(self, db_pool, admit=None):
+        """
+        The watermark, or None if no validator should be handed out. admit, if given, returns an
+        async context manager held around the read, such as an admission slot.
+        """
+        if self._expired():
+            async with self._lock:
+                # Concurrent callers share the refresh done by whoever took the lock first
+                if self._expired():
+                    await self._refresh(db_pool, admit)
+        if self._changes is None:
+            return None
+        return f"{self._changes}/{write_count()}"
@@ -5,7 +5,56 @@ CREATE TABLE IF NOT EXISTS `items` (
   `id` binary(16) NOT NULL,
   `name` varchar(255) NOT NULL,
   `category` varchar(255) NOT NULL,
-  `price` varchar(10) NOT NULL,
+  `price` decimal(12,2) NOT NULL,
   `last_updated_dt` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_items_name` (`name`),
+  KEY `idx_items_last_updated_dt` (`last_updated_dt`),
+  KEY `idx_items_category_price` (`category`, `price`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+CREATE TABLE IF NOT EXISTS `item_category_summary` (
+  `category` varchar(255) NOT NULL,
+  `item_count` int NOT NULL,
+  `total_price` decimal(20,2) NOT NULL,
+  `last_updated_dt` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`category`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Keep item_category_summary in step with every write to items
+CREATE TRIGGER `items_category_summary_insert` AFTER INSERT ON `items` FOR EACH ROW
+  INSERT INTO `item_category_summary` (`category`, `item_count`, `total_price`) VALUES (NEW.category, 1, NEW.price) AS delta
+  ON DUPLICATE KEY UPDATE `item_count` = `item_count` + delta.item_count, `total_price` = `total_price` + delta.total_price;
+
+-- The previous category is left in @items_prev_category for cache invalidation
+DELIMITER //
+CREATE TRIGGER `items_category_summary_update` AFTER UPDATE ON `items` FOR EACH ROW
+BEGIN
+  SET @items_prev_category = OLD.category;
+  INSERT INTO `item_category_summary` (`category`, `item_count`, `total_price`) VALUES (OLD.category, -1, -OLD.price), (NEW.category, 1, NEW.price) AS delta
+  ON DUPLICATE KEY UPDATE `item_count` = `item_count` + delta.item_count, `total_price` = `total_price` + delta.total_price;
+END//
+DELIMITER ;
+
+CREATE TRIGGER `items_category_summary_delete` AFTER DELETE ON `items` FOR EACH ROW
+  INSERT INTO `item_category_summary` (`category`, `item_count`, `total_price`) VALUES (OLD.category, -1, -OLD.price) AS delta
+  ON DUPLICATE KEY UPDATE `item_count` = `item_count` + delta.item_count, `total_price` = `total_price` + delta.total_price;
+
+-- Commits to items per connection; their sum is the change watermark behind ETags
+CREATE TABLE IF NOT EXISTS `items_change_count` (
+  `connection_id` bigint unsigned NOT NULL,
+  `changes` bigint unsigned NOT NULL,
+  PRIMARY KEY (`connection_id`)
+) ENGINE=InnoDB;
+
+CREATE TRIGGER `items_change_count_insert` AFTER INSERT ON `items` FOR EACH ROW
+  INSERT INTO `items_change_count` (`connection_id`, `changes`) VALUES (CONNECTION_ID(), 1)
+  ON DUPLICATE KEY UPDATE `changes` = `changes` + 1;
+
+CREATE TRIGGER `items_change_count_update` AFTER UPDATE ON `items` FOR EACH ROW
+  INSERT INTO `items_change_count` (`connection_id`, `changes`) VALUES (CONNECTION_ID(), 1)
+  ON DUPLICATE KEY UPDATE `changes` = `changes` + 1;
+
+CREATE TRIGGER `items_change_count_delete` AFTER DELETE ON `items` FOR EACH ROW
+  INSERT INTO `items_change_count` (`connection_id`, `changes`) VALUES (CONNECTION_ID(), 1)
+  ON DUPLICATE KEY UPDATE `changes` = `changes` + 1;
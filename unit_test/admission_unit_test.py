@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from api_operations.admission import AdmissionController, AdmissionRejected, READ, REPORT, WRITE
+
+
+@pytest.mark.asyncio
+async def test_released_slot_goes_to_the_most_favored_waiter():
+    admission = AdmissionController(max_concurrent=1, queue_size=10, max_wait=1)
+    order = []
+
+    async def request(name, priority):
+        async with admission.admit(priority):
+            order.append(name)
+
+    await admission.acquire(READ)
+    waiters = [
+        asyncio.create_task(request("report", REPORT)),
+        asyncio.create_task(request("read", READ)),
+        asyncio.create_task(request("write", WRITE)),
+    ]
+    await asyncio.sleep(0)
+    assert admission.stats()["queued"] == 3
+
+    admission.release()
+    await asyncio.gather(*waiters)
+
+    assert order == ["write", "read", "report"]
+    assert admission.stats() == {"in_flight": 0, "queued": 0, "max_concurrent": 1, "queue_size": 10}
+
+
+@pytest.mark.asyncio
+async def test_full_queue_displaces_less_favored_waiters_only():
+    admission = AdmissionController(max_concurrent=1, queue_size=1, max_wait=1)
+    await admission.acquire(READ)
+    report = asyncio.create_task(admission.acquire(REPORT))
+    await asyncio.sleep(0)
+
+    write = asyncio.create_task(admission.acquire(WRITE))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as displaced:
+        await report
+    # A read does not displace the queued write
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire(READ)
+
+    admission.release()
+    await write
+    assert displaced.value.reason == "displaced"
+    assert rejected.value.reason == "queue_full"
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_shed_at_their_deadline():
+    admission = AdmissionController(max_concurrent=1, queue_size=10, max_wait=0.01, retry_after=3)
+    await admission.acquire(WRITE)
+
+    with pytest.raises(AdmissionRejected) as shed:
+        await admission.acquire(READ)
+
+    assert shed.value.reason == "timeout" and shed.value.retry_after == 3
+    admission.release()
+    assert admission.stats()["in_flight"] == 0 and admission.stats()["queued"] == 0
@@ -0,0 +1,219 @@
+import json
+import uuid
+import pytest
+import httpx
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+from app import app, get_admission_controllers, get_change_watermark
+from api_operations.admission import AdmissionController, WRITE
+from database_operations.database import get_db_pool, PoolAcquireTimeout
+
+DATE_RANGE = {"dt_from": "2023-01-01T00:00:00", "dt_to": "2023-01-02T00:00:00"}
+
+
+def make_streaming_pool(batches):
+    # Mock a server-side cursor handing out the given batches, then an empty one
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchmany.side_effect = batches + [[]]
+    conn_mock = AsyncMock()
+    conn_mock.cursor.return_value = cursor_mock
+    conn_mock.close = MagicMock()
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+    return db_pool_mock, cursor_mock
+
+
+def make_item(n):
+    return (str(uuid.uuid4()), f"Item {n}", "Gift", Decimal("1.25"), datetime(2023, 1, 1, 12, 0, n))
+
+
+@pytest.fixture
+def override_pool():
+    def override(db_pool):
+        app.dependency_overrides[get_db_pool] = lambda: db_pool
+    yield override
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_stream_items_as_ndjson(override_pool):
+    db_pool_mock, cursor_mock = make_streaming_pool([[make_item(0), make_item(1)], [make_item(2)]])
+    override_pool(db_pool_mock)
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request("GET", "/items/", params={"stream": "ndjson"}, json=DATE_RANGE)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["name"] for line in lines[:-1]] == ["Item 0", "Item 1", "Item 2"]
+    # The running total arrives as a trailer record
+    assert lines[-1] == {"count": 3, "total_price": 3.75}
+    cursor_mock.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_stream_items_as_chunked_json(override_pool):
+    db_pool_mock, _ = make_streaming_pool([[make_item(0)], [make_item(1)]])
+    override_pool(db_pool_mock)
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request("GET", "/items/", params={"stream": "json"}, json=DATE_RANGE)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["name"] for item in body["items"]] == ["Item 0", "Item 1"]
+    assert body["total_price"] == 2.5
+
+
+@pytest.mark.asyncio
+async def test_streamed_json_matches_the_buffered_body(override_pool):
+    rows = [make_item(0), make_item(1)]
+    db_pool_mock, cursor_mock = make_streaming_pool([[rows[0]], [rows[1]]])
+    # The buffered query enters the cursor as a context manager and fetches every row at once
+    cursor_mock.__aenter__.return_value = cursor_mock
+    cursor_mock.fetchall.return_value = rows
+    override_pool(db_pool_mock)
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        streamed = await client.request("GET", "/items/", params={"stream": "json"}, json=DATE_RANGE)
+        buffered = await client.request("GET", "/items/", json=DATE_RANGE)
+
+    assert streamed.content == buffered.content
+
+
+@pytest.mark.asyncio
+async def test_stream_items_empty_range(override_pool):
+    db_pool_mock, _ = make_streaming_pool([])
+    override_pool(db_pool_mock)
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request("GET", "/items/", params={"stream": "json"}, json=DATE_RANGE)
+
+    assert response.json() == {"items": [], "total_price": 0.0}
+
+
+@pytest.mark.asyncio
+async def test_matching_if_none_match_skips_the_query(override_pool):
+    # Enough rows for two full streamed responses
+    db_pool_mock, cursor_mock = make_streaming_pool([[make_item(0)], [], [make_item(0)]])
+    override_pool(db_pool_mock)
+    change_watermark = MagicMock()
+    change_watermark.current = AsyncMock(return_value="2023-01-01T12:00:00/0")
+    app.dependency_overrides[get_change_watermark] = lambda: change_watermark
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request("GET", "/items/", params={"stream": "ndjson"}, json=DATE_RANGE)
+        etag = response.headers["etag"]
+        cached = await client.request(
+            "GET", "/items/", params={"stream": "ndjson"}, json=DATE_RANGE, headers={"If-None-Match": etag}
+        )
+        other_range = await client.request(
+            "GET", "/items/", params={"stream": "ndjson"}, json={**DATE_RANGE, "dt_to": "2023-01-03T00:00:00"},
+            headers={"If-None-Match": etag}
+        )
+
+    assert response.status_code == 200
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+    # A different request has a different ETag; only the first and third requests queried items
+    assert other_range.status_code == 200
+    assert cursor_mock.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_arrow_listing_is_streamed_from_cursor_rows(override_pool):
+    pyarrow = pytest.importorskip("pyarrow")
+    db_pool_mock, _ = make_streaming_pool([[make_item(0), make_item(1)], [make_item(2)]])
+    override_pool(db_pool_mock)
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request(
+            "GET", "/items/", json=DATE_RANGE, headers={"Accept": "application/vnd.apache.arrow.stream"}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.column("name").to_pylist() == ["Item 0", "Item 1", "Item 2"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("page", [{"limit": 10}, {"page_token": "abc"}])
+async def test_stream_with_pagination_is_rejected(override_pool, page):
+    db_pool_mock, cursor_mock = make_streaming_pool([])
+    override_pool(db_pool_mock)
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request("GET", "/items/", params={"stream": "ndjson", **page}, json=DATE_RANGE)
+
+    assert response.status_code == 400
+    cursor_mock.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_unsupported_accept_is_not_acceptable(override_pool):
+    db_pool_mock, cursor_mock = make_streaming_pool([])
+    override_pool(db_pool_mock)
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request("GET", "/items/", json=DATE_RANGE, headers={"Accept": "text/csv"})
+
+    assert response.status_code == 406
+    cursor_mock.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_exhausted_pool_answers_503_with_retry_after(override_pool):
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.side_effect = PoolAcquireTimeout("default", 10)
+    override_pool(db_pool_mock)
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request("GET", "/items/", json=DATE_RANGE)
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_shed_request_answers_503_without_querying(override_pool):
+    db_pool_mock, cursor_mock = make_streaming_pool([])
+    db_pool_mock.name = "oltp"
+    override_pool(db_pool_mock)
+    admission = AdmissionController(max_concurrent=1, queue_size=0, retry_after=2)
+    await admission.acquire(WRITE)
+    app.dependency_overrides[get_admission_controllers] = lambda: {"oltp": admission}
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.request("GET", "/items/", params={"stream": "ndjson"}, json=DATE_RANGE)
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "2"
+    cursor_mock.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_whole_ranges_use_the_reporting_pool_and_pages_the_oltp_pool(override_pool):
+    oltp_pool, oltp_cursor = make_streaming_pool([])
+    reporting_pool, reporting_cursor = make_streaming_pool([[make_item(0)]])
+    override_pool(oltp_pool)
+    app.state.reporting_pool = reporting_pool
+    # The paged listing enters the cursor's context
+    oltp_cursor.__aenter__.return_value = oltp_cursor
+    oltp_cursor.fetchall.return_value = []
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+            report = await client.request("GET", "/items/", params={"stream": "ndjson"}, json=DATE_RANGE)
+            page = await client.request("GET", "/items/", params={"limit": 10}, json=DATE_RANGE)
+    finally:
+        del app.state.reporting_pool
+
+    assert report.status_code == 200 and page.status_code == 200
+    reporting_cursor.execute.assert_awaited_once()
+    oltp_cursor.execute.assert_awaited_once()
+    # The first page runs no range aggregate on the OLTP pool
+    assert "SUM(" not in oltp_cursor.execute.await_args.args[0]
@@ -0,0 +1,57 @@
+from database_operations.cache import ALL_CATEGORIES, MISSING, CategoryCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = CategoryCache(ttl=5, max_entries=10, clock=clock)
+    cache.put("Gift", [{"category": "Gift"}])
+
+    assert cache.get("gift") == [{"category": "Gift"}]
+    clock.now = 5
+    assert cache.get("Gift") is MISSING
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CategoryCache(ttl=60, max_entries=2)
+    cache.put("A", [])
+    cache.put("B", [])
+    cache.get("A")
+    cache.put("C", [])
+
+    assert cache.get("B") is MISSING
+    assert cache.get("A") == []
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_drops_categories_and_all():
+    cache = CategoryCache(ttl=60, max_entries=10)
+    for key in ("Café", "Tools", "Toys", ALL_CATEGORIES):
+        cache.put(key, [key])
+
+    # Keys compare like the accent- and case-insensitive column collation
+    cache.invalidate({"CAFE", "Toys"})
+
+    assert cache.get("café") is MISSING
+    assert cache.get("Toys") is MISSING
+    assert cache.get(ALL_CATEGORIES) is MISSING
+    assert cache.get("Tools") == ["Tools"]
+
+
+def test_put_is_skipped_after_concurrent_invalidation():
+    cache = CategoryCache(ttl=60, max_entries=10)
+    generation = cache.generation
+    cache.invalidate({"Gift"})  # A write committed while the read was in flight
+    cache.put("Gift", ["stale"], generation)
+
+    assert cache.get("Gift") is MISSING
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 1)
@@ -0,0 +1,78 @@
+import os
+import re
+import pytest
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+from database_operations.category_summary import (
+    INITIAL_TRIGGERS, TRIGGERS, replace_changed_triggers, verify_category_summary
+)
+
+INIT_SQL = os.path.join(os.path.dirname(__file__), "..", "init.sql")
+
+
+def init_sql_trigger_bodies() -> dict:
+    """Trigger bodies as init.sql writes them, which is how information_schema reports them."""
+    with open(INIT_SQL) as f:
+        sql = f.read()
+    pattern = r"CREATE TRIGGER `(\w+)` AFTER \w+ ON `items` FOR EACH ROW\n(.*?)(?:;\n\n|;\n*$|//)"
+    return {match.group(1): match.group(2) for match in re.finditer(pattern, sql, re.S)}
+
+
+def make_conn(cursor_mock):
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    return conn_mock
+
+
+@pytest.mark.asyncio
+async def test_verify_category_summary_matches():
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.side_effect = [
+        [("Fruit", 2, Decimal("3.50")), ("Café", 1, Decimal("2.00"))],
+        [("fruit", 2, Decimal("3.50")), ("cafe", 1, Decimal("2.00"))],
+    ]
+
+    # Case and accent variants are the same category under the column collation
+    assert await verify_category_summary(make_conn(cursor_mock)) == []
+
+
+@pytest.mark.asyncio
+async def test_verify_category_summary_reports_differences():
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.side_effect = [
+        [("Fruit", 2, Decimal("3.50")), ("Tools", 1, Decimal("10.00"))],
+        [("Fruit", 1, Decimal("1.50")), ("Toys", 1, Decimal("5.00"))],
+    ]
+
+    problems = await verify_category_summary(make_conn(cursor_mock))
+
+    assert problems == [
+        "Fruit: items has 2 items totalling 3.50, summary has 1 totalling 1.50",
+        "Tools: items has 1 items totalling 10.00, summary has 0 totalling 0",
+        "Toys: items has 0 items totalling 0, summary has 1 totalling 5.00",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_triggers_created_by_init_sql_are_left_alone():
+    bodies = init_sql_trigger_bodies()
+    assert bodies.keys() >= TRIGGERS.keys()
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchone.side_effect = [(bodies[name],) for name in TRIGGERS]
+
+    await replace_changed_triggers(TRIGGERS)(make_conn(cursor_mock), cursor_mock)
+
+    executed = [call.args[0] for call in cursor_mock.execute.await_args_list]
+    assert not any(sql.startswith(("DROP", "CREATE", "LOCK")) for sql in executed)
+
+
+@pytest.mark.asyncio
+async def test_changed_trigger_is_replaced():
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchone.side_effect = [(INITIAL_TRIGGERS[name][1],) for name in TRIGGERS]
+
+    await replace_changed_triggers(TRIGGERS)(make_conn(cursor_mock), cursor_mock)
+
+    executed = [call.args[0] for call in cursor_mock.execute.await_args_list]
+    assert [sql for sql in executed if sql.startswith("DROP")] == ["DROP TRIGGER IF EXISTS items_category_summary_update"]
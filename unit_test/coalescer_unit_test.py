@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+import aiomysql
+from unittest.mock import AsyncMock, MagicMock
+from database_operations.coalescer import WRITE_COALESCING_BATCH_SIZE, WriteCoalescer
+
+
+def make_pool(cursor_mock):
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+    return db_pool_mock, conn_mock
+
+
+@pytest.mark.asyncio
+async def test_concurrent_inserts_share_one_commit():
+    # Every upsert inserts a new row
+    cursor_mock = AsyncMock()
+    cursor_mock.rowcount = 1
+    db_pool_mock, conn_mock = make_pool(cursor_mock)
+
+    coalescer = WriteCoalescer(db_pool_mock, max_batch_size=3, max_delay=1)
+    items = [{"name": f"Item {i}", "category": "Gift", "price": i} for i in range(3)]
+
+    results = await asyncio.gather(*(coalescer.insert_item(item) for item in items))
+
+    assert len({result["id"] for result in results}) == 3
+    conn_mock.commit.assert_awaited_once()
+    assert coalescer.stats()["batches"] == 1
+    assert coalescer.stats()["mean_batch_size"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failing_row_only_fails_its_own_caller():
+    # The second item's upsert is rejected by MySQL the first time it is attempted
+    cursor_mock = AsyncMock()
+    cursor_mock.rowcount = 1
+
+    async def execute(query, params):
+        if params[1] == "Bad":
+            raise aiomysql.DataError("Data too long")
+
+    cursor_mock.execute = AsyncMock(side_effect=execute)
+    db_pool_mock, conn_mock = make_pool(cursor_mock)
+
+    # Flushed by the timer rather than the batch size
+    coalescer = WriteCoalescer(db_pool_mock, max_batch_size=10, max_delay=0.01)
+    results = await asyncio.gather(
+        coalescer.insert_item({"name": "Good", "category": "Gift", "price": 1}),
+        coalescer.insert_item({"name": "Bad", "category": "Gift", "price": 2}),
+        coalescer.insert_item({"name": "Also good", "category": "Gift", "price": 3}),
+        return_exceptions=True,
+    )
+
+    assert "id" in results[0]
+    assert isinstance(results[1], aiomysql.DataError)
+    assert "id" in results[2]
+    conn_mock.rollback.assert_awaited_once()
+    conn_mock.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_invalid_item_is_rejected_before_batching():
+    coalescer = WriteCoalescer(MagicMock(), max_batch_size=10, max_delay=1)
+
+    with pytest.raises(ValueError):
+        await coalescer.insert_item({"name": "No price", "category": "Gift"})
+    assert coalescer.stats()["batches"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unexpected_row_error_only_fails_its_own_caller():
+    cursor_mock = AsyncMock()
+    cursor_mock.rowcount = 1
+
+    async def execute(query, params):
+        if params[1] == "Bad":
+            raise TypeError("cannot encode value")
+
+    cursor_mock.execute = AsyncMock(side_effect=execute)
+    db_pool_mock, conn_mock = make_pool(cursor_mock)
+
+    coalescer = WriteCoalescer(db_pool_mock, max_batch_size=3, max_delay=1)
+    results = await asyncio.gather(
+        coalescer.insert_item({"name": "Good", "category": "Gift", "price": 1}),
+        coalescer.insert_item({"name": "Bad", "category": "Gift", "price": 2}),
+        coalescer.insert_item({"name": "Also good", "category": "Gift", "price": 3}),
+        return_exceptions=True,
+    )
+
+    assert "id" in results[0]
+    assert isinstance(results[1], TypeError)
+    assert "id" in results[2]
+    assert coalescer.stats()["retries"] == 1
+    assert WRITE_COALESCING_BATCH_SIZE.count() >= 1
+
+
+@pytest.mark.asyncio
+async def test_batch_is_written_in_lock_order_and_retried_after_a_deadlock():
+    cursor_mock = AsyncMock()
+    cursor_mock.rowcount = 1
+    written = []
+    deadlocked = []
+
+    async def execute(query, params):
+        written.append((params[2], params[1]))
+        if not deadlocked:
+            deadlocked.append(1)
+            raise aiomysql.OperationalError(1213, "Deadlock found when trying to get lock")
+
+    cursor_mock.execute = AsyncMock(side_effect=execute)
+    db_pool_mock, conn_mock = make_pool(cursor_mock)
+
+    coalescer = WriteCoalescer(db_pool_mock, max_batch_size=3, max_delay=1)
+    results = await asyncio.gather(
+        coalescer.insert_item({"name": "Mug", "category": "Toys", "price": 1}),
+        coalescer.insert_item({"name": "Pen", "category": "Éclairs", "price": 2}),
+        coalescer.insert_item({"name": "Cup", "category": "eclairs", "price": 3}),
+    )
+
+    # Every caller succeeds; the deadlock cost the batch one more attempt, not a caller its write
+    assert all("id" in result for result in results)
+    assert coalescer.stats()["deadlock_retries"] == 1
+    assert coalescer.stats()["retries"] == 0
+    # Accent and case variants of a category sort together, ahead of later categories
+    assert written[1:] == [("eclairs", "Cup"), ("Éclairs", "Pen"), ("Toys", "Mug")]
+    conn_mock.commit.assert_awaited_once()
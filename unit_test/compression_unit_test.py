@@ -0,0 +1,97 @@
+import asyncio
+import gzip
+import pytest
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from api_operations.compression import CompressionMiddleware, choose_encoding
+
+BODY = b'{"name": "Item", "category": "Stationary", "price": 1.5}\n' * 100
+
+
+async def complete(request):
+    return Response(BODY, media_type="application/json")
+
+
+async def small(request):
+    return Response(b"{}", media_type="application/json")
+
+
+async def streamed(request):
+    async def chunks():
+        for _ in range(3):
+            yield BODY
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+app = CompressionMiddleware(
+    Starlette(routes=[Route("/complete", complete), Route("/small", small), Route("/streamed", streamed)]),
+    min_size=1024,
+)
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("", None),
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0.5, zstd", "zstd"),
+    ("*;q=0.1, zstd;q=0", "gzip"),
+    ("identity", None),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding, ["zstd", "gzip"]) == expected
+
+
+@pytest.mark.asyncio
+async def test_gzip_applies_only_above_min_size():
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        large = await client.get("/complete", headers={"Accept-Encoding": "gzip"})
+        tiny = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert large.headers["content-encoding"] == "gzip"
+    assert int(large.headers["content-length"]) < len(BODY)
+    assert large.content == BODY  # Decoded by httpx
+    assert "content-encoding" not in tiny.headers
+    assert tiny.content == b"{}"
+
+
+@pytest.mark.asyncio
+async def test_streamed_body_is_compressed_chunk_by_chunk():
+    sent = []
+    disconnected = asyncio.Event()
+
+    async def receive():
+        # Starlette listens for a disconnect while streaming
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/streamed", "headers": [(b"accept-encoding", b"gzip")],
+        "query_string": b"", "root_path": "", "scheme": "http", "server": ("testserver", 80),
+    }
+    await app(scope, receive, send)
+
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    # Every chunk is flushed as it arrives rather than held back until the end
+    bodies = [message["body"] for message in sent[1:]]
+    assert len(bodies) == 4
+    assert all(bodies[:3])
+    assert gzip.decompress(b"".join(bodies)) == BODY * 3
+
+
+@pytest.mark.asyncio
+async def test_zstd_when_preferred():
+    zstandard = pytest.importorskip("zstandard")
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        async with client.stream("GET", "/complete", headers={"Accept-Encoding": "zstd, gzip;q=0.5"}) as response:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+
+    assert response.headers["content-encoding"] == "zstd"
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(raw) == BODY
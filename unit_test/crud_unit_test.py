@@ -4,10 +4,15 @@ import os
 # Add the parent directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import asyncio
+import contextlib
 import pytest
+import uuid
 from datetime import datetime
+from decimal import Decimal
 from unittest.mock import AsyncMock, MagicMock, patch
-from database_operations.crud import insert_item, get_items_within_date_range
+from database_operations.crud import insert_item, insert_items, import_items, get_items_within_date_range, _validate_item
+from database_operations.crud import encode_page_token, decode_page_token
 from database_operations.models import DateRangeInput
 
 @pytest.mark.asyncio
@@ -118,6 +123,29 @@ async def test_update_existing_item():
     assert result['id'].strip("b'") == expected_id.encode().hex()
 
 
+@pytest.mark.asyncio
+async def test_insert_new_item_uses_single_upsert():
+    # Mock a cursor reporting that the upsert inserted a new row
+    cursor_mock = AsyncMock()
+    cursor_mock.rowcount = 1
+    conn_mock = AsyncMock()
+    conn_mock.cursor.return_value = cursor_mock
+
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire = AsyncMock(return_value=conn_mock)
+    db_pool_mock.release = AsyncMock()
+
+    result = await insert_item({"name": "New Item", "category": "Gift", "price": 12.5}, db_pool_mock)
+
+    # The id is the generated UUID and no follow-up lookup is needed
+    assert uuid.UUID(result["id"])
+    cursor_mock.execute.assert_awaited_once()
+    query, params = cursor_mock.execute.await_args.args
+    assert "ON DUPLICATE KEY UPDATE" in query
+    assert params[1:] == ("New Item", "Gift", Decimal("12.50"))
+    conn_mock.commit.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_get_items_within_date_range():
     # Mock the database pool
@@ -128,9 +156,15 @@ async def test_get_items_within_date_range():
     cursor_mock = AsyncMock()
 
     # Define the list of items to be returned by fetchall
+    item_id_1, item_id_2 = uuid.uuid4(), uuid.uuid4()
+    updated = datetime(2023, 1, 1, 12, 0)
+    rows = [
+        (str(item_id_1), 'Item 1', 'Gift', Decimal('10.00'), updated),
+        (str(item_id_2), 'Item 2', 'Gift', Decimal('20.00'), updated)
+    ]
     items = [
-        {'id': 'item_id_1', 'name': 'Item 1', 'category': 'Gift', 'price': '10.00'},
-        {'id': 'item_id_2', 'name': 'Item 2', 'category': 'Gift', 'price': '20.00'}
+        {'id': str(item_id_1), 'name': 'Item 1', 'category': 'Gift', 'price': Decimal('10.00'), 'last_updated_dt': updated},
+        {'id': str(item_id_2), 'name': 'Item 2', 'category': 'Gift', 'price': Decimal('20.00'), 'last_updated_dt': updated}
     ]
 
     # Define the expected result
@@ -142,8 +176,8 @@ async def test_get_items_within_date_range():
     # Mock the execute method of the cursor
     cursor_mock.execute = AsyncMock()
 
-    # Patch the fetchall method of the cursor to return the list of items
-    cursor_mock.fetchall = AsyncMock(return_value=items)
+    # Patch the fetchall method of the cursor to return the rows as tuples
+    cursor_mock.fetchall = AsyncMock(return_value=rows)
 
     # Patch the __aenter__ method of the cursor to return the cursor mock
     conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
@@ -177,4 +211,314 @@ async def test_get_items_within_date_range_negative():
     result = await get_items_within_date_range(date_range, mock_db_pool)
 
     # Assert that the result is as expected
-    assert result == {"message": "No items found within the specified date range"}
\ No newline at end of file
+    assert result == {"message": "No items found within the specified date range"}
+
+@pytest.mark.asyncio
+async def test_insert_items_bulk_returns_per_item_results():
+    items = [
+        {"name": "Pen", "category": "Stationary", "price": "1.50"},
+        {"name": "Mug", "category": "Gift"},  # Missing price
+        {"name": "Book", "category": "Stationary", "price": 12},
+        {"name": "Pen", "category": "Art", "price": "2.00"},  # Last occurrence wins
+    ]
+    ids = {"Book": uuid.uuid4(), "Pen": uuid.uuid4()}
+
+    # Mock the cursor: the read-back query returns the stored id of every upserted name
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.return_value = [(ids["Book"].bytes, "Book"), (ids["Pen"].bytes, "Pen")]
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+
+    results = await insert_items(items, db_pool_mock, chunk_size=10)
+
+    assert results[0] == {"id": str(ids["Pen"])}
+    assert "error" in results[1]
+    assert results[2] == {"id": str(ids["Book"])}
+    assert results[3] == {"id": str(ids["Pen"])}
+
+    # One multi-row upsert, rows sorted by category then name, committed once
+    upsert_query, upsert_params = cursor_mock.execute.await_args_list[0].args
+    assert upsert_query.count("(%s, %s, %s, %s)") == 2
+    assert upsert_params[1:4] == ["Pen", "Art", Decimal("2.00")]
+    assert upsert_params[5:8] == ["Book", "Stationary", Decimal("12.00")]
+    conn_mock.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_import_items_streams_ndjson_in_batches(monkeypatch):
+    monkeypatch.setattr("database_operations.crud.MAX_IMPORT_LINE_BYTES", 100)
+
+    # Records split across chunk boundaries, with a bad record and an oversized one
+    async def body():
+        yield b'{"name": "A", "category": "Gift", "price": 1}\n{"name": "B", "cat'
+        yield b'egory": "Gift", "price": 2}\nnot json\n\n'
+        yield b'{"name": "' + b"x" * 200 + b'"}\n'
+        yield b'{"name": "C", "category": "Gift", "price": 3}'
+
+    cursor_mock = AsyncMock()
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+
+    summary = await import_items(body(), db_pool_mock, batch_size=2)
+
+    assert summary["records"] == 5
+    assert summary["written"] == 3
+    assert summary["failed"] == 2
+    assert summary["batches"] == 2
+    assert [error["line"] for error in summary["errors"]] == [3, 5]
+
+    # A connection is acquired and a transaction committed per batch
+    assert db_pool_mock.acquire.call_count == 2
+    assert conn_mock.commit.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_import_items_records_non_string_name_and_continues():
+    async def body():
+        yield b'{"name": "A", "category": "Gift", "price": 1}\n'
+        yield b'{"name": 123, "category": "Gift", "price": 2}\n'
+        yield b'{"name": "C", "category": ["Gift"], "price": 3}\n'
+        yield b'{"name": "D", "category": "Gift", "price": 4}\n'
+
+    cursor_mock = AsyncMock()
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+
+    summary = await import_items(body(), db_pool_mock, batch_size=1)
+
+    assert summary["records"] == 4
+    assert summary["written"] == 2
+    assert summary["failed"] == 2
+    assert [error["line"] for error in summary["errors"]] == [2, 3]
+    assert "Invalid name" in summary["errors"][0]["error"]
+    assert "Invalid category" in summary["errors"][1]["error"]
+    assert conn_mock.commit.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_import_items_admits_each_batch_write_only():
+    holding = []
+    admitted = []
+
+    async def body():
+        for name in ("A", "B", "C"):
+            # Nothing is held while the next record is being read
+            assert holding == []
+            yield b'{"name": "%s", "category": "Gift", "price": 1}\n' % name.encode()
+
+    @contextlib.asynccontextmanager
+    async def admit():
+        holding.append(1)
+        admitted.append(1)
+        try:
+            yield
+        finally:
+            holding.pop()
+
+    cursor_mock = AsyncMock()
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+
+    summary = await import_items(body(), db_pool_mock, batch_size=1, admit=admit)
+
+    assert summary["written"] == 3
+    assert len(admitted) == 3
+
+
+@pytest.mark.parametrize("price, expected", [
+    ("10", Decimal("10.00")),
+    (0.1 + 0.2, Decimal("0.30")),
+    ("2.675", Decimal("2.68")),
+    ("abc", None),
+    ("NaN", None),
+    (1e12, None),
+])
+def test_validate_item_price_is_exact_decimal(price, expected):
+    item = {"name": "Item", "category": "Gift", "price": price}
+
+    if expected is None:
+        with pytest.raises(ValueError):
+            _validate_item(item)
+    else:
+        assert _validate_item(item)[2] == expected
+
+
+@pytest.mark.asyncio
+async def test_get_items_within_date_range_keyset_pagination():
+    ids = [uuid.uuid4() for _ in range(3)]
+    rows = [
+        (str(item_id), f'Item {n}', 'Gift', Decimal('1.00'), datetime(2023, 1, 1, 12, 0, n))
+        for n, item_id in enumerate(ids)
+    ]
+
+    # The database returns limit + 1 rows, so another page follows
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.return_value = rows
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value.cursor.return_value.__aenter__.return_value = cursor_mock
+
+    date_range = DateRangeInput(dt_from=datetime(2023, 1, 1), dt_to=datetime(2023, 1, 2))
+    page_token = encode_page_token(datetime(2023, 1, 1, 11, 0, 0), b"\x00" * 16)
+    result = await get_items_within_date_range(date_range, db_pool_mock, limit=2, page_token=page_token)
+
+    assert [item['id'] for item in result['items']] == [str(item_id) for item_id in ids[:2]]
+    # Pages never carry the total of the range
+    assert 'total_price' not in result
+    assert decode_page_token(result['next_page_token']) == (rows[1][4], ids[1].bytes)
+
+    # The page seeks past the token with an index-ordered LIMIT, not an OFFSET
+    query, params = cursor_mock.execute.await_args.args
+    assert "ORDER BY last_updated_dt, id LIMIT %s" in query
+    assert "OFFSET" not in query
+    assert params[2:] == [datetime(2023, 1, 1, 11, 0, 0), datetime(2023, 1, 1, 11, 0, 0), b"\x00" * 16, 3]
+
+
+def test_decode_page_token_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_page_token("not-a-token")
+
+
+@pytest.mark.asyncio
+async def test_first_page_does_not_aggregate_the_whole_range():
+    rows = [(str(uuid.uuid4()), 'Item 0', 'Gift', Decimal('1.00'), datetime(2023, 1, 1, 12))]
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.return_value = rows
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value.cursor.return_value.__aenter__.return_value = cursor_mock
+
+    date_range = DateRangeInput(dt_from=datetime(2023, 1, 1), dt_to=datetime(2023, 1, 2))
+    result = await get_items_within_date_range(date_range, db_pool_mock, limit=10)
+
+    assert result["next_page_token"] is None
+    assert "total_price" not in result
+    # Only the page query runs
+    cursor_mock.execute.assert_awaited_once()
+    assert "SUM(" not in cursor_mock.execute.await_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_get_items_within_date_range_totals_only():
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchone.return_value = (3, Decimal("42.50"))
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value.cursor.return_value.__aenter__.return_value = cursor_mock
+
+    date_range = DateRangeInput(dt_from=datetime(2023, 1, 1), dt_to=datetime(2023, 1, 2))
+    result = await get_items_within_date_range(date_range, db_pool_mock, totals_only=True)
+
+    assert result == {"count": 3, "total_price": Decimal("42.50")}
+    # Only the aggregate runs; no rows are fetched
+    query, _ = cursor_mock.execute.await_args.args
+    assert "SUM(price)" in query
+    cursor_mock.fetchall.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_items_within_date_range_admits_only_the_running_query():
+    release = asyncio.Event()
+
+    async def fetchone():
+        await release.wait()
+        return (3, Decimal("42.50"))
+
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchone.side_effect = fetchone
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value.cursor.return_value.__aenter__.return_value = cursor_mock
+
+    admitted = []
+
+    @contextlib.asynccontextmanager
+    async def admit():
+        admitted.append(1)
+        yield
+
+    date_range = DateRangeInput(dt_from=datetime(2023, 1, 1), dt_to=datetime(2023, 1, 2))
+    calls = [
+        asyncio.ensure_future(get_items_within_date_range(date_range, db_pool_mock, totals_only=True, admit=admit))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*calls)
+
+    assert all(result == {"count": 3, "total_price": Decimal("42.50")} for result in results)
+    assert admitted == [1]
+
+
+@pytest.mark.asyncio
+async def test_insert_item_invalidates_old_and_new_category():
+    # The upsert updated an existing item; the update trigger recorded its old category
+    cursor_mock = AsyncMock()
+    cursor_mock.rowcount = 2
+    cursor_mock.fetchone.return_value = (b"\x01" * 16, "Toys")
+    conn_mock = AsyncMock()
+    conn_mock.cursor.return_value = cursor_mock
+
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire = AsyncMock(return_value=conn_mock)
+    db_pool_mock.release = AsyncMock()
+    category_cache = MagicMock()
+
+    result = await insert_item({"name": "Ball", "category": "Sports", "price": 5}, db_pool_mock, category_cache)
+
+    assert result == {"id": "01" * 16}
+    category_cache.invalidate.assert_called_once_with({"Sports", "Toys"})
+
+
+@pytest.mark.asyncio
+async def test_insert_item_without_previous_category_trigger():
+    # Before migration 6 the update trigger leaves @items_prev_category NULL
+    cursor_mock = AsyncMock()
+    cursor_mock.rowcount = 2
+    cursor_mock.fetchone.return_value = (b"\x01" * 16, None)
+    conn_mock = AsyncMock()
+    conn_mock.cursor.return_value = cursor_mock
+
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire = AsyncMock(return_value=conn_mock)
+    db_pool_mock.release = AsyncMock()
+    category_cache = MagicMock()
+
+    result = await insert_item({"name": "Ball", "category": "Sports", "price": 5}, db_pool_mock, category_cache)
+
+    assert result == {"id": "01" * 16}
+    category_cache.invalidate.assert_called_once_with({"Sports"})
+
+
+@pytest.mark.asyncio
+async def test_insert_items_bulk_rejects_non_string_names_per_item():
+    items = [
+        {"name": "Pen", "category": "Stationary", "price": "1.50"},
+        {"name": 5, "category": "Stationary", "price": "1.00"},
+        {"name": "Mug", "category": "", "price": "3.00"},
+        {"name": "x" * 256, "category": "Gift", "price": "3.00"},
+    ]
+    pen_id = uuid.uuid4()
+
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.return_value = [(pen_id.bytes, "Pen")]
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+
+    results = await insert_items(items, db_pool_mock, chunk_size=10)
+
+    assert results[0] == {"id": str(pen_id)}
+    assert results[1] == {"error": "Invalid name: must be a non-empty string of at most 255 characters"}
+    assert results[2] == {"error": "Invalid category: must be a non-empty string of at most 255 characters"}
+    assert "error" in results[3]
@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from database_operations.database import DatabasePool, PoolAcquireTimeout, create_db_pool, close_db_pool
+from database_operations.metrics import (
+    DB_POOL_ACQUIRE_TIMEOUTS, DB_POOL_WAITING, DB_POOL_CONNECTIONS, DB_POOL_CONNECTION_AGE_SECONDS,
+    DB_POOL_CONNECTIONS_OPENED, DB_POOL_CONNECTIONS_CLOSED
+)
+
+
+@pytest.mark.asyncio
+async def test_acquire_context_manager_releases_connection():
+    # Mock the underlying aiomysql pool
+    conn = MagicMock()
+    raw_pool = MagicMock()
+    raw_pool.acquire = AsyncMock(return_value=conn)
+    raw_pool.release = AsyncMock()
+
+    db_pool = DatabasePool(raw_pool, acquire_timeout=1)
+
+    async with db_pool.acquire() as acquired:
+        assert acquired is conn
+
+    raw_pool.release.assert_awaited_once_with(conn)
+
+
+@pytest.mark.asyncio
+async def test_acquire_times_out_when_pool_is_exhausted():
+    # Simulate a pool whose connections are all checked out
+    async def never_free():
+        await asyncio.sleep(10)
+
+    raw_pool = MagicMock()
+    raw_pool.acquire = MagicMock(side_effect=never_free)
+
+    db_pool = DatabasePool(raw_pool, acquire_timeout=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await db_pool.acquire()
+
+
+@pytest.mark.asyncio
+async def test_acquire_timeout_is_counted_and_reported_as_pool_acquire_timeout():
+    async def never_free():
+        await asyncio.sleep(10)
+
+    raw_pool = MagicMock()
+    raw_pool.acquire = MagicMock(side_effect=never_free)
+    db_pool = DatabasePool(raw_pool, acquire_timeout=0.01, name="timeouts")
+
+    with pytest.raises(PoolAcquireTimeout):
+        await db_pool.acquire()
+
+    assert DB_POOL_ACQUIRE_TIMEOUTS.value("timeouts") == 1
+    assert DB_POOL_WAITING.value("timeouts") == 0
+
+
+@pytest.mark.asyncio
+async def test_connections_are_counted_as_opened_and_recycled():
+    now = [0.0]
+    first, second = MagicMock(closed=False), MagicMock(closed=False)
+    raw_pool = MagicMock(size=2, freesize=1, maxsize=10)
+    raw_pool.acquire = AsyncMock(side_effect=[first, first, second])
+    raw_pool.release = AsyncMock()
+    db_pool = DatabasePool(raw_pool, acquire_timeout=1, name="recycling", recycle=60, clock=lambda: now[0])
+
+    async with db_pool.acquire():
+        pass
+    now[0] = 90.0
+    async with db_pool.acquire():
+        pass
+    # The pool recycled the first connection and opened another
+    first.closed = True
+    async with db_pool.acquire():
+        pass
+
+    assert DB_POOL_CONNECTIONS_OPENED.value("recycling") == 2
+    assert DB_POOL_CONNECTIONS_CLOSED.value("recycling", "recycled") == 1
+    assert DB_POOL_CONNECTION_AGE_SECONDS.count("recycling") == 3
+    assert DB_POOL_CONNECTIONS.value("recycling", "in_use") == 1
+
+
+class FakeConnection:
+    """Just enough of aiomysql.Connection for aiomysql.Pool, tracking implicit transactions."""
+
+    def __init__(self, autocommit=False, **kwargs):
+        self.autocommit_mode = autocommit
+        self.in_transaction = False
+        self.closed = False
+        self.last_usage = 0
+        self._reader = MagicMock(eof_received=False)
+        self._reader.at_eof.return_value = False
+        self._reader.exception.return_value = None
+
+    async def query(self, sql):
+        # Outside autocommit, InnoDB opens a transaction with the first statement
+        self.in_transaction = self.in_transaction or not self.autocommit_mode
+
+    def get_transaction_status(self):
+        return self.in_transaction
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_connection_is_reused_after_a_read(monkeypatch):
+    opened = []
+
+    async def connect(echo=False, loop=None, **kwargs):
+        opened.append(FakeConnection(**kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr("aiomysql.pool.connect", connect)
+    db_pool = await create_db_pool({"minsize": 0, "maxsize": 1, "pool_recycle": -1}, name="reuse")
+    try:
+        async with db_pool.acquire() as conn:
+            await conn.query("SELECT 1")
+        async with db_pool.acquire() as again:
+            pass
+    finally:
+        await close_db_pool(db_pool)
+
+    assert again is conn
+    assert len(opened) == 1
@@ -0,0 +1,20 @@
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from database_operations.decoders import ITEM_ROW
+
+
+def test_item_rows_are_paired_with_column_names():
+    item_id = str(uuid.uuid4())
+    # Values pass through untouched, bytes included
+    row = (item_id, b"raw-name", "Gift", Decimal("9.99"), datetime(2023, 1, 1))
+
+    assert ITEM_ROW.decode_rows([row]) == [{
+        "id": item_id,
+        "name": b"raw-name",
+        "category": "Gift",
+        "price": Decimal("9.99"),
+        "last_updated_dt": datetime(2023, 1, 1),
+    }]
+    assert ITEM_ROW.decode(row) == ITEM_ROW.decode_rows([row])[0]
+
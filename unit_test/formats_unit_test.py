@@ -0,0 +1,51 @@
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from api_operations.formats import ARROW_STREAM, JSON, MSGPACK, negotiate
+
+ROWS = (
+    ("0190f5f4-0000-7000-8000-000000000001", "Pen", "Stationary", Decimal("1.50"), datetime(2023, 1, 1, 12)),
+    ("0190f5f4-0000-7000-8000-000000000002", "Mug", "Gift", Decimal("8.00"), datetime(2023, 1, 2, 12)),
+)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("*/*", JSON),
+    ("application/x-msgpack", MSGPACK),
+    ("application/json;q=0.5, application/vnd.apache.arrow.stream", ARROW_STREAM),
+    ("application/*;q=0.2, application/msgpack;q=0.9", MSGPACK),
+    ("text/csv", None),
+    ("application/json;q=0", None),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept, [JSON, MSGPACK, ARROW_STREAM]) == expected
+
+
+def test_msgpack_packs_rows_as_arrays():
+    msgpack = pytest.importorskip("msgpack")
+    from api_operations.formats import MessagePackResponse
+
+    response = MessagePackResponse({"items": ROWS, "total_price": Decimal("9.50")})
+    body = msgpack.unpackb(response.body)
+
+    assert body["columns"] == ["id", "name", "category", "price", "last_updated_dt"]
+    assert body["items"][1] == [ROWS[1][0], "Mug", "Gift", 8.0, "2023-01-02T12:00:00"]
+    assert body["total_price"] == 9.5
+
+
+@pytest.mark.asyncio
+async def test_arrow_stream_round_trips_batches():
+    pyarrow = pytest.importorskip("pyarrow")
+    from api_operations.formats import encode_arrow_stream
+
+    async def batches():
+        yield ROWS[:1]
+        yield ROWS[1:]
+
+    body = b"".join([chunk async for chunk in encode_arrow_stream(batches())])
+    table = pyarrow.ipc.open_stream(body).read_all()
+
+    assert table.num_rows == 2
+    assert table.column("price").to_pylist() == [Decimal("1.50"), Decimal("8.00")]
+    assert table.column("last_updated_dt").to_pylist()[1] == datetime(2023, 1, 2, 12)
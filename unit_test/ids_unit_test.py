@@ -0,0 +1,21 @@
+import time
+from database_operations.ids import uuid7
+
+
+def test_uuid7_layout():
+    item_id = uuid7()
+
+    assert item_id.version == 7
+    assert item_id.variant == "specified in RFC 4122"
+    # The leading 48 bits carry the creation time in milliseconds
+    assert abs((item_id.int >> 80) - time.time() * 1000) < 5000
+    # The external string format is unchanged
+    assert len(str(item_id)) == 36
+
+
+def test_uuid7_is_monotonic_within_process():
+    ids = [uuid7() for _ in range(20000)]
+
+    # Binary order (the InnoDB clustered index order) follows creation order
+    assert [item_id.bytes for item_id in ids] == sorted(item_id.bytes for item_id in ids)
+    assert len(set(ids)) == len(ids)
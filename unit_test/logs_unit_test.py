@@ -0,0 +1,81 @@
+import io
+import json
+import logging
+import queue
+import pytest
+import httpx
+from fastapi import FastAPI
+from api_operations.logs import (
+    DebugRateLimiter, NonBlockingQueueHandler, RequestIdMiddleware, LOG_RECORDS_DROPPED, configure_logging, request_id
+)
+
+
+def make_record(level=logging.DEBUG, name="app"):
+    return logging.LogRecord(name, level, __file__, 1, "Creating item %r", ("Pen",), None)
+
+
+def test_debug_records_are_rate_limited_per_logger():
+    now = [0.0]
+    limiter = DebugRateLimiter(rate=2, clock=lambda: now[0])
+
+    assert [limiter.filter(make_record()) for _ in range(3)] == [True, True, False]
+    # Other loggers and levels have their own allowance
+    assert limiter.filter(make_record(name="database_operations.crud"))
+    assert limiter.filter(make_record(level=logging.ERROR))
+    now[0] = 0.5
+    assert limiter.filter(make_record())
+    assert not limiter.filter(make_record())
+
+
+def test_full_queue_drops_records_without_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    before = LOG_RECORDS_DROPPED.value("queue_full")
+
+    handler.handle(make_record(level=logging.INFO))
+    handler.handle(make_record(level=logging.INFO))
+
+    assert handler.queue.qsize() == 1
+    assert LOG_RECORDS_DROPPED.value("queue_full") == before + 1
+
+
+def test_records_are_written_as_json_with_the_request_id():
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    stream = io.StringIO()
+    config = {"level": "INFO", "levels": {"noisy": "ERROR"}, "format": "json", "debug_rate": 10, "queue_size": 100}
+    listener = configure_logging(config, stream)
+    try:
+        token = request_id.set("req-1")
+        logging.getLogger("app").info("Creating item %r", "Pen")
+        request_id.reset(token)
+        logging.getLogger("noisy").warning("Suppressed")
+    finally:
+        listener.stop()
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+        logging.getLogger("noisy").setLevel(logging.NOTSET)
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    entry = json.loads(lines[0])
+    assert entry["message"] == "Creating item 'Pen'"
+    assert entry["request_id"] == "req-1"
+    assert entry["logger"] == "app" and entry["level"] == "INFO"
+
+
+@pytest.mark.asyncio
+async def test_request_id_is_taken_from_the_client_or_generated():
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/")
+    async def current_request_id():
+        return {"request_id": request_id.get()}
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        given = await client.get("/", headers={"X-Request-ID": "abc"})
+        generated = await client.get("/")
+
+    assert given.json() == {"request_id": "abc"} and given.headers["x-request-id"] == "abc"
+    assert len(generated.json()["request_id"]) == 32
+    assert generated.headers["x-request-id"] == generated.json()["request_id"]
@@ -0,0 +1,51 @@
+import pytest
+import httpx
+from unittest.mock import AsyncMock
+from database_operations.metrics import Counter, Histogram, render, STATEMENT_EXECUTE_SECONDS
+from database_operations import statements
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = []
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0), registry=registry)
+    errors = Counter("errors_total", "Errors.", ("route", "error"), registry=registry)
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "/items/")
+    errors.inc("/items/", "mysql")
+
+    assert render(registry).splitlines() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/items/",le="0.1"} 1',
+        'latency_seconds_bucket{route="/items/",le="1.0"} 3',
+        'latency_seconds_bucket{route="/items/",le="+Inf"} 4',
+        'latency_seconds_sum{route="/items/"} 4.05',
+        'latency_seconds_count{route="/items/"} 4',
+        "# HELP errors_total Errors.",
+        "# TYPE errors_total counter",
+        'errors_total{route="/items/",error="mysql"} 1',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_statement_execution_is_timed_even_when_it_fails():
+    cursor_mock = AsyncMock()
+    cursor_mock.execute.side_effect = RuntimeError("Lost connection")
+    before = STATEMENT_EXECUTE_SECONDS.count("items.id_by_name")
+
+    with pytest.raises(RuntimeError):
+        await statements.ITEM_ID_BY_NAME.execute(cursor_mock, ("Pen",))
+
+    assert STATEMENT_EXECUTE_SECONDS.count("items.id_by_name") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_request_latency_by_route():
+    from app import app
+
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        await client.get("/admin/read-coalescing")
+        response = await client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{route="/admin/read-coalescing",method="GET",status="200"}' in response.text
@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from database_operations import statements
+from database_operations.migrations import apply_migrations, check_query_plans
+
+
+def make_conn(cursor_mock):
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    return conn_mock
+
+
+@pytest.mark.asyncio
+async def test_apply_migrations_runs_pending_versions_in_order():
+    # Version 1 is already recorded in schema_migrations
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.return_value = [(1,)]
+    conn_mock = make_conn(cursor_mock)
+
+    calls = []
+
+    def step(name):
+        async def run(conn, cursor):
+            calls.append(name)
+        return run
+
+    migrations = [
+        (3, "third", [step("3a"), step("3b")]),
+        (1, "first", [step("1")]),
+        (2, "second", [step("2")]),
+    ]
+
+    applied = await apply_migrations(conn_mock, migrations)
+
+    assert applied == [2, 3]
+    assert calls == ["2", "3a", "3b"]
+    assert conn_mock.commit.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_check_query_plans_reports_full_table_scans():
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.side_effect = [
+        [{"table": "items", "type": "ref", "key": "uq_items_name", "possible_keys": "uq_items_name"}],
+        [{"table": "items", "type": "ALL", "key": None, "possible_keys": None}],
+    ]
+    conn_mock = make_conn(cursor_mock)
+
+    registry = {
+        "indexed": statements.Statement("indexed", "SELECT id FROM items WHERE name = %s", ("",)),
+        "scan": statements.Statement("scan", "SELECT id FROM items WHERE price > %s", (0,)),
+        "write": statements.Statement("write", "INSERT INTO items VALUES {values}"),
+    }
+
+    problems = await check_query_plans(conn_mock, registry)
+
+    assert len(problems) == 1
+    assert problems[0].startswith("scan:")
+    # Writes are not explained
+    assert cursor_mock.execute.await_count == 2
+
+
+def test_every_read_statement_is_plan_checked():
+    for statement in statements.STATEMENTS.values():
+        if statement.sql.lstrip().upper().startswith("SELECT"):
+            assert statement.explain_params is not None, statement.name
@@ -0,0 +1,30 @@
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from api_operations.responses import FastJSONResponse
+
+
+def test_fast_json_response_matches_jsonable_encoder_output():
+    content = {
+        "items": [
+            {
+                "id": uuid.uuid4(),
+                "name": "Café ☕",
+                "category": "Gift",
+                "price": Decimal("12.50"),
+                "last_updated_dt": datetime(2023, 1, 1, 12, 0, 0, 123456),
+            },
+        ],
+        "count": Decimal("3"),
+        "total_price": Decimal("12.50"),
+        "next_page_token": None,
+    }
+
+    fast = FastJSONResponse(content)
+    standard = JSONResponse(jsonable_encoder(content))
+
+    assert json.loads(fast.body) == json.loads(standard.body)
+    assert fast.headers["content-type"] == "application/json"
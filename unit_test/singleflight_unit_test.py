@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from database_operations.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def query():
+        calls.append(1)
+        await release.wait()
+        return {"total": 42}
+
+    waiters = [asyncio.ensure_future(flights.do("key", query)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert flights.stats()["in_flight"] == 1
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {"executions": 1, "shared": 4, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter_and_are_not_cached():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def failing_query():
+        await release.wait()
+        raise RuntimeError("Lost connection")
+
+    waiters = [asyncio.ensure_future(flights.do("key", failing_query)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    # The next call runs again
+    async def query():
+        return "ok"
+
+    assert await flights.do("key", query) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_the_others():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def query():
+        await release.wait()
+        return "ok"
+
+    first = asyncio.ensure_future(flights.do("key", query))
+    second = asyncio.ensure_future(flights.do("key", query))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == "ok"
+    assert first.cancelled()
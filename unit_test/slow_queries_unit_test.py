@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from database_operations import statements
+from database_operations.metrics import STATEMENT_ROWS, STATEMENT_BYTES
+from database_operations.slow_queries import SlowQueryLog
+
+
+def make_pool(cursor_mock):
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+    return db_pool_mock
+
+
+@pytest.mark.asyncio
+async def test_slow_executions_are_kept_newest_first_and_explained_once():
+    log = SlowQueryLog(threshold=0.1, capacity=2, max_params=4)
+    log.record("items.id_by_name", "SELECT id FROM items WHERE name = %s", ("Pen",), 0.05)
+    log.record("items.id_by_name", "SELECT id FROM items WHERE name = %s", ("Book",), 0.2)
+    log.record("items.ids_by_names", "SELECT id, name FROM items WHERE name IN (%s, %s)", (b"\x01", "Pen"), 0.3)
+    log.record("items.upsert", "INSERT ...", tuple(range(8)), 0.4)
+
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.return_value = [{"table": "items", "key": "idx_name"}]
+    db_pool_mock = make_pool(cursor_mock)
+    await log.explain_pending(db_pool_mock)
+    await log.explain_pending(db_pool_mock)
+
+    newest, oldest = log.entries()
+    assert log.captured == 3
+    # Truncated parameters cannot be explained
+    assert newest["statement"] == "items.upsert"
+    assert newest["truncated"] and newest["params"] == [0, 1, 2, 3] and newest["plan"] is None
+    assert oldest["params"] == ["01", "Pen"]
+    assert oldest["plan"] == [{"table": "items", "key": "idx_name"}]
+    cursor_mock.execute.assert_awaited_once_with(
+        "EXPLAIN SELECT id, name FROM items WHERE name IN (%s, %s)", (b"\x01", "Pen")
+    )
+
+
+@pytest.mark.asyncio
+async def test_statement_fetches_count_rows_and_estimated_bytes():
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchall.return_value = [("Pen", "Stationary", None), ("Book", "Books", 7)]
+    rows_before = STATEMENT_ROWS.value("category.totals_all")
+    bytes_before = STATEMENT_BYTES.value("category.totals_all")
+
+    await statements.CATEGORY_TOTALS_ALL.fetchall(cursor_mock)
+
+    assert STATEMENT_ROWS.value("category.totals_all") == rows_before + 2
+    assert STATEMENT_BYTES.value("category.totals_all") == bytes_before + 13 + 9 + 8
@@ -0,0 +1,88 @@
+import pytest
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+from database_operations import watermark
+from database_operations.watermark import ChangeWatermark, fold_change_count
+
+
+def make_pool(cursor_mock):
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+    return db_pool_mock
+
+
+@pytest.mark.asyncio
+async def test_watermark_changes_with_local_writes_and_is_reused():
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchone.return_value = (Decimal(41),)
+    db_pool_mock = make_pool(cursor_mock)
+    change_watermark = ChangeWatermark(max_age=60)
+
+    before = await change_watermark.current(db_pool_mock)
+    watermark.record_write()
+    after = await change_watermark.current(db_pool_mock)
+
+    assert before.startswith("41/")
+    assert before != after
+    cursor_mock.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_watermark_moves_with_commits_by_other_processes():
+    # Another worker committed rows, whatever their last_updated_dt, between the two reads
+    clock = [0.0]
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchone.side_effect = [(Decimal(41),), (Decimal(42),)]
+    db_pool_mock = make_pool(cursor_mock)
+    change_watermark = ChangeWatermark(max_age=1, clock=lambda: clock[0])
+
+    before = await change_watermark.current(db_pool_mock)
+    clock[0] = 1.0
+    after = await change_watermark.current(db_pool_mock)
+
+    assert before != after
+
+
+@pytest.mark.asyncio
+async def test_fold_change_count_keeps_the_sum():
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchone.return_value = (Decimal(17), 3)
+    conn_mock = AsyncMock()
+    conn_mock.cursor = MagicMock()
+    conn_mock.cursor.return_value.__aenter__.return_value = cursor_mock
+    db_pool_mock = MagicMock()
+    db_pool_mock.acquire.return_value.__aenter__.return_value = conn_mock
+
+    await fold_change_count(db_pool_mock)
+
+    executed = [call.args for call in cursor_mock.execute.await_args_list]
+    assert "FOR UPDATE" in executed[0][0]
+    assert executed[1][0].startswith("DELETE")
+    assert executed[2][1] == (Decimal(17),)
+    conn_mock.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_gives_no_watermark_until_the_next_attempt():
+    clock = [0.0]
+    cursor_mock = AsyncMock()
+    cursor_mock.fetchone.return_value = (Decimal(41),)
+    db_pool_mock = make_pool(cursor_mock)
+    change_watermark = ChangeWatermark(max_age=1, clock=lambda: clock[0])
+    attempts = []
+
+    def shed():
+        attempts.append(1)
+        raise RuntimeError("shed")
+
+    # The failure is not retried by every caller within max_age
+    assert await change_watermark.current(db_pool_mock, admit=shed) is None
+    assert await change_watermark.current(db_pool_mock, admit=shed) is None
+    assert attempts == [1]
+    cursor_mock.execute.assert_not_awaited()
+
+    clock[0] = 1.0
+    assert await change_watermark.current(db_pool_mock) is not None